@@ -31,6 +31,9 @@ class AccredibleConfig(AppConfig):
                 SettingsType.COMMON: {
                     PluginSettings.RELATIVE_PATH: u'settings.common'
                 },
+                SettingsType.AWS: {
+                    PluginSettings.RELATIVE_PATH: u'settings.aws'
+                },
             }
         }
     }
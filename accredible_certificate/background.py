@@ -0,0 +1,188 @@
+"""
+Background processing of request_certificate calls.
+
+With ``ACCREDIBLE_ASYNC_MODE`` set, request_certificate only records a
+``CertificateRequest`` and hands it to a worker: a Celery task
+(``'celery'``) or a thread inside the LMS process (``'local'``, for
+single-node setups). The dashboard polls certificate_request_status until
+the request is done.
+
+While a worker processes a request it refreshes the request's ``modified``
+time, so only requests whose worker is gone become stale and are queued
+again: a slow request never gets a duplicate issuing the same credential.
+"""
+import json
+import logging
+import threading
+from datetime import timedelta
+from Queue import Queue
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from opaque_keys.edx.keys import CourseKey
+
+from accredible_certificate.models import CertificateRequest
+from accredible_certificate.queue import request_certificate_for
+
+logger = logging.getLogger(__name__)
+
+ASYNC_CELERY = 'celery'
+ASYNC_LOCAL = 'local'
+
+DEFAULT_STALE_AFTER = 600
+
+# CertificateRequest.result of a request given up by submit_certificate_request
+STALE = 'stale'
+
+
+def async_mode():
+    return getattr(settings, 'ACCREDIBLE_ASYNC_MODE', None)
+
+
+def stale_after():
+    return getattr(settings, 'ACCREDIBLE_ASYNC_STALE_AFTER', DEFAULT_STALE_AFTER)
+
+
+class Heartbeat(object):
+    """
+    Refreshes the ``modified`` time of a processing request every
+    ``interval`` seconds, from its own thread, until the block exits.
+    """
+
+    def __init__(self, request_id, interval):
+        self.request_id = request_id
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                CertificateRequest.objects.filter(
+                    id=self.request_id,
+                    status=CertificateRequest.PROCESSING
+                ).update(modified=timezone.now())
+        except Exception:
+            logger.exception(
+                'Heartbeat of certificate request {} failed'.format(
+                    self.request_id))
+        finally:
+            connection.close()
+
+
+def run_certificate_request(request_id):
+    """
+    Process the CertificateRequest ``request_id`` unless a worker already did.
+    """
+    claimed = CertificateRequest.objects.filter(
+        id=request_id,
+        status=CertificateRequest.PENDING
+    ).update(status=CertificateRequest.PROCESSING)
+    if not claimed:
+        return
+    cert_request = CertificateRequest.objects.select_related('user').get(
+        id=request_id)
+    try:
+        with Heartbeat(request_id, stale_after() / 3.0):
+            result = request_certificate_for(
+                cert_request.user,
+                CourseKey.from_string(cert_request.course_id),
+                settings.APPSEMBLER_FEATURES['ACCREDIBLE_API_KEY']
+            )
+    except Exception:
+        logger.exception(
+            'Certificate request {} for user {} in course {} failed'.format(
+                request_id, cert_request.user_id, cert_request.course_id))
+        cert_request.status = CertificateRequest.FAILED
+    else:
+        cert_request.status = CertificateRequest.DONE
+        cert_request.result = json.dumps(result)
+    cert_request.save()
+
+
+class LocalWorker(object):
+    """
+    Single daemon thread processing certificate requests in this process.
+    """
+
+    def __init__(self):
+        self.queue = Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, request_id):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+        self.queue.put(request_id)
+
+    def _run(self):
+        while True:
+            request_id = self.queue.get()
+            close_old_connections()
+            try:
+                run_certificate_request(request_id)
+            except Exception:
+                logger.exception(
+                    'Unable to process certificate request {}'.format(request_id))
+            finally:
+                close_old_connections()
+
+
+local_worker = LocalWorker()
+
+
+def submit_certificate_request(student, course_key):
+    """
+    Record a certificate request and hand it to the configured worker.
+
+    Returns the active request of the student for the course if there is
+    one already, so repeated clicks don't queue duplicate work. An active
+    request not updated for ``ACCREDIBLE_ASYNC_STALE_AFTER`` seconds was
+    lost by its worker, whose heartbeat stopped: it is marked failed and a
+    new one is queued.
+    """
+    course_id = unicode(course_key)
+    active = [CertificateRequest.PENDING, CertificateRequest.PROCESSING]
+    cert_request = CertificateRequest.objects.filter(
+        user=student,
+        course_id=course_id,
+        status__in=active
+    ).order_by('-id').first()
+    if cert_request is not None:
+        if cert_request.modified > timezone.now() - timedelta(seconds=stale_after()):
+            return cert_request
+        logger.warning(
+            'Certificate request {} for user {} in course {} is stale'.format(
+                cert_request.id, student.id, course_id))
+        CertificateRequest.objects.filter(
+            user=student,
+            course_id=course_id,
+            status__in=active
+        ).update(
+            status=CertificateRequest.FAILED,
+            result=json.dumps(STALE),
+            # update() bypasses auto_now
+            modified=timezone.now()
+        )
+
+    cert_request = CertificateRequest.objects.create(
+        user=student, course_id=course_id)
+    if async_mode() == ASYNC_CELERY:
+        from accredible_certificate.tasks import process_certificate_request
+        process_certificate_request.delay(cert_request.id)
+    else:
+        local_worker.submit(cert_request.id)
+    return cert_request
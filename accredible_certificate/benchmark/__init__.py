@@ -0,0 +1,4 @@
+"""
+Benchmarking helpers for the Accredible integration, see the
+benchmark_accredible_certs management command.
+"""
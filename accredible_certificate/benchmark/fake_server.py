@@ -0,0 +1,213 @@
+"""
+Local stand-in for the Accredible credentials API, used by benchmarks.
+
+Implements the endpoints the integration calls (create, bulk create,
+search, update and the paginated course listing) on an in-memory store,
+with configurable latency and rates of 5xx errors and 429 responses.
+
+Can also be run on its own::
+
+    python -m accredible_certificate.benchmark.fake_server --port 8765 --latency 80
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs, urlparse
+
+API_PREFIX = '/v1/'
+
+
+class FakeAccredible(object):
+    """
+    In-memory credential store and behaviour settings of the fake API.
+
+    Arguments:
+      latency       - seconds added to every response
+      error_rate    - share of calls answered with a 503
+      throttle_rate - share of calls answered with a 429
+      retry_after   - Retry-After sent with 429 responses, in seconds
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.credentials = {}
+        self.calls = {}
+        self._next_id = 10000000
+        self._lock = threading.Lock()
+
+    def count(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = {}
+
+    def create(self, credential):
+        with self._lock:
+            self._next_id += 1
+            credential = dict(credential, id=self._next_id)
+            credential.setdefault("approve", False)
+            credential["url"] = "https://www.credential.net/" + str(self._next_id)
+            credential["updated_at"] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            self.credentials[self._next_id] = credential
+            return credential
+
+    def approve_all(self):
+        with self._lock:
+            for credential in self.credentials.values():
+                credential["approve"] = True
+
+    def outcome(self):
+        """
+        Draw the failure (if any) of the next call.
+        """
+        draw = self.random.random()
+        if draw < self.throttle_rate:
+            return 429
+        if draw < self.throttle_rate + self.error_rate:
+            return 503
+        return None
+
+
+class FakeAccredibleHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def api(self):
+        return self.server.api
+
+    def respond(self, status, body=None, headers=None):
+        data = json.dumps(body or {})
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or '{}')
+
+    def handle_api(self, method):
+        url = urlparse(self.path)
+        path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else None
+        body = self.read_body() if method in ('POST', 'PUT') else None
+        endpoint = '{} {}'.format(
+            method, 'credentials/<id>' if path and path[12:].isdigit() else path)
+        self.api.count(endpoint)
+        time.sleep(self.api.latency)
+        failure = self.api.outcome()
+        if failure == 429:
+            return self.respond(
+                429, {"error": "throttled"},
+                {'Retry-After': str(self.api.retry_after)})
+        if failure:
+            return self.respond(failure, {"error": "unavailable"})
+
+        if method == 'POST' and path == 'credentials':
+            credential = self.api.create(body["credential"])
+            return self.respond(200, {"credential": credential})
+        if method == 'POST' and path == 'credentials/bulk_create':
+            return self.respond(200, {"results": [
+                {"credential": self.api.create(credential)}
+                for credential in body["credentials"]
+            ]})
+        if method == 'POST' and path == 'credentials/search':
+            email = body["recipient"]["email"]
+            return self.respond(200, {"credentials": [
+                credential for credential in self.api.credentials.values()
+                if credential["recipient"]["email"] == email
+            ]})
+        if method == 'PUT' and path and path.startswith('credentials/'):
+            credential = self.api.credentials.get(int(path[12:]))
+            if credential is None:
+                return self.respond(404, {"error": "not found"})
+            credential.update(body["credential"])
+            return self.respond(200, {"credential": credential})
+        if method == 'GET' and path == 'credentials':
+            query = parse_qs(url.query)
+            achievement_id = query.get('achievement_id', [None])[0]
+            email = query.get('email', [None])[0]
+            page = int(query.get('page', [1])[0])
+            page_size = int(query.get('page_size', [50])[0])
+            matching = sorted(
+                (credential for credential in self.api.credentials.values()
+                 if credential.get("achievement_id") == achievement_id and
+                 (email is None or credential["recipient"]["email"] == email)),
+                key=lambda credential: credential["id"]
+            )
+            total_pages = max((len(matching) + page_size - 1) // page_size, 1)
+            return self.respond(200, {
+                "credentials": matching[(page - 1) * page_size:page * page_size],
+                "meta": {
+                    "current_page": page,
+                    "next_page": page + 1 if page < total_pages else None,
+                    "total_pages": total_pages,
+                    "total_count": len(matching),
+                }
+            })
+        return self.respond(404, {"error": "unknown endpoint"})
+
+    def do_GET(self):
+        self.handle_api('GET')
+
+    def do_POST(self):
+        self.handle_api('POST')
+
+    def do_PUT(self):
+        self.handle_api('PUT')
+
+
+class FakeAccredibleServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, api, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), FakeAccredibleHandler)
+        self.api = api
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}{}'.format(self.server_address[1], API_PREFIX)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle-rate', type=float, default=0)
+    args = parser.parse_args()
+    server = FakeAccredibleServer(
+        FakeAccredible(args.latency / 1000.0, args.error_rate, args.throttle_rate),
+        args.port
+    )
+    print('Fake Accredible API listening on ' + server.url)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
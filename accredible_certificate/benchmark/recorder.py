@@ -0,0 +1,36 @@
+"""
+Metrics sink keeping timings in memory so benchmarks can report percentiles.
+"""
+import threading
+
+from accredible_certificate.metrics import NullSink
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of ``values``, None when empty.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+class RecordingSink(NullSink):
+    """
+    Keeps every timing (in ms) and counter per metric name.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def timing(self, name, value, tags=None):
+        with self._lock:
+            self.timings.setdefault(name, []).append(value)
+
+    def increment(self, name, value=1, tags=None):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
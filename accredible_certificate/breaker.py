@@ -0,0 +1,111 @@
+"""
+Circuit breaker protecting the LMS from Accredible outages.
+
+After ``failure_threshold`` consecutive failed or slow calls the breaker
+opens and every call fails fast with ``CircuitOpenError`` instead of
+tying up an LMS worker for the whole timeout. After ``reset_timeout``
+seconds one probe call is let through (half open): it closes the breaker
+when it succeeds and opens it again when it fails.
+
+The state is reported as the ``accredible.circuit.state`` gauge, 0 closed,
+1 half open and 2 open.
+"""
+import logging
+import threading
+import time
+
+import requests
+
+from accredible_certificate import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_SLOW_CALL = 10.0
+DEFAULT_RESET_TIMEOUT = 30.0
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised instead of calling Accredible while the breaker is open.
+    """
+
+
+class CircuitBreaker(object):
+    """
+    Thread safe breaker shared by every call made with one api key.
+
+    Arguments:
+      failure_threshold - consecutive failures opening the breaker
+      slow_call         - seconds after which a successful call counts as
+                          a failure
+      reset_timeout     - seconds the breaker stays open before a probe
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 slow_call=DEFAULT_SLOW_CALL,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """
+        Whether calls are currently refused, without claiming the probe.
+        """
+        with self._lock:
+            return self.state == OPEN and (
+                time.time() - self.opened_at < self.reset_timeout)
+
+    def before_call(self):
+        """
+        Raise ``CircuitOpenError`` when the call must not be sent.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    metrics.increment('circuit.rejected')
+                    raise CircuitOpenError('Accredible circuit breaker is open')
+                self._set_state(HALF_OPEN)
+            if self._probing:
+                metrics.increment('circuit.rejected')
+                raise CircuitOpenError('Accredible circuit breaker is half open')
+            self._probing = True
+
+    def record(self, success, duration=0):
+        """
+        Record the outcome of a call let through by ``before_call``.
+        """
+        success = success and duration < self.slow_call
+        with self._lock:
+            self._probing = False
+            if success:
+                self.failures = 0
+                if self.state != CLOSED:
+                    self._set_state(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                    self.state == CLOSED and
+                    self.failures >= self.failure_threshold):
+                self.opened_at = time.time()
+                self._set_state(OPEN)
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning(u'Accredible circuit breaker {} -> {}'.format(
+                self.state, state))
+        self.state = state
+        metrics.gauge('circuit.state', STATE_VALUES[state])
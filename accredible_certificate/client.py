@@ -0,0 +1,297 @@
+"""
+Thin HTTP client for the Accredible API.
+
+All calls to Accredible go through a single ``AccredibleClient`` per api key,
+which keeps a pooled ``requests.Session`` (so TLS connections are reused
+between learners), applies connect/read timeouts and retries with backoff on
+connection errors and 5xx responses. Calls are paced by an
+``AdaptiveRateLimiter`` that backs off when Accredible answers 429, and
+guarded by a ``CircuitBreaker`` that fails fast while Accredible is down.
+"""
+import json
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from accredible_certificate.breaker import CircuitBreaker, CircuitOpenError
+from accredible_certificate.ratelimit import AdaptiveRateLimiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'https://api.accredible.com/v1/'
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_POOL_SIZE = 10
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_RATE_LIMIT = 10
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_THROTTLE_RETRIES = 5
+DEFAULT_REQUEST_MAX_WAIT = 1.0
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_SLOW_CALL = 10.0
+DEFAULT_BREAKER_RESET = 30.0
+
+RETRY_STATUSES = (500, 502, 503, 504)
+# Only these methods are retried after the request reached the server, a
+# failed credential POST may already have created the credential.
+IDEMPOTENT_METHODS = frozenset(['GET', 'PUT', 'HEAD', 'OPTIONS'])
+
+
+class ThrottledError(requests.RequestException):
+    """
+    Raised instead of waiting longer than ``max_wait`` for the rate limiter.
+    """
+
+
+class AccredibleClient(object):
+    """
+    Reusable client for the Accredible credentials API.
+
+    Connection errors are retried for every method, read errors and
+    5xx responses only for idempotent ones.
+
+    ``throttle_retries`` (default ``ACCREDIBLE_THROTTLE_RETRIES``) is how
+    often a throttled call is sent again, ``max_wait`` the seconds a call
+    may wait for the rate limiter (None waits as long as it takes).
+    """
+
+    def __init__(self, api_key, api_url=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff_factor=None,
+                 pool_size=None, limiter=None, breaker=None, share=1,
+                 throttle_retries=None, max_wait=None):
+        self.api_key = api_key
+        self.api_url = api_url or getattr(
+            settings, 'ACCREDIBLE_API_URL', DEFAULT_API_URL)
+        if not self.api_url.endswith('/'):
+            self.api_url += '/'
+        self.timeout = (
+            connect_timeout or getattr(
+                settings, 'ACCREDIBLE_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            read_timeout or getattr(
+                settings, 'ACCREDIBLE_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+        )
+        if max_retries is None:
+            max_retries = getattr(
+                settings, 'ACCREDIBLE_MAX_RETRIES', DEFAULT_MAX_RETRIES)
+        if backoff_factor is None:
+            backoff_factor = getattr(
+                settings, 'ACCREDIBLE_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF)
+        pool_size = pool_size or getattr(
+            settings, 'ACCREDIBLE_POOL_SIZE', DEFAULT_POOL_SIZE)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            method_whitelist=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+        )
+        # ``share`` processes send calls with this api key, each gets its
+        # part of the rate limit and concurrency
+        self.limiter = limiter or AdaptiveRateLimiter(
+            max_rate=float(getattr(
+                settings, 'ACCREDIBLE_RATE_LIMIT', DEFAULT_RATE_LIMIT)) / share,
+            max_concurrency=max(getattr(
+                settings, 'ACCREDIBLE_MAX_CONCURRENCY',
+                DEFAULT_MAX_CONCURRENCY) // share, 1),
+        )
+        if throttle_retries is None:
+            throttle_retries = getattr(
+                settings, 'ACCREDIBLE_THROTTLE_RETRIES', DEFAULT_THROTTLE_RETRIES)
+        self.throttle_retries = throttle_retries
+        self.max_wait = max_wait
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=getattr(
+                settings, 'ACCREDIBLE_BREAKER_FAILURES', DEFAULT_BREAKER_FAILURES),
+            slow_call=getattr(
+                settings, 'ACCREDIBLE_BREAKER_SLOW_CALL', DEFAULT_BREAKER_SLOW_CALL),
+            reset_timeout=getattr(
+                settings, 'ACCREDIBLE_BREAKER_RESET', DEFAULT_BREAKER_RESET),
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': 'Token token=' + api_key,
+            'Content-Type': 'application/json'
+        })
+
+    def url(self, path):
+        return self.api_url + path.lstrip('/')
+
+    def request(self, method, path, data=None, params=None):
+        """
+        Send a request to the API and return the ``requests.Response``.
+
+        ``data`` is JSON encoded unless it is already a string. Network
+        failures that survive the retries raise ``requests.RequestException``.
+        Throttled (429) calls are retried after the Retry-After delay, the
+        last 429 response is returned once ``throttle_retries`` run out.
+        While the circuit breaker is open ``CircuitOpenError``, and when the
+        rate limiter would hold the call longer than ``max_wait``
+        ``ThrottledError`` (both ``requests.RequestException``) is raised
+        without calling Accredible.
+        """
+        if data is not None and not isinstance(data, basestring):
+            data = json.dumps(data)
+        attempt = 0
+        while True:
+            if not self.limiter.acquire(self.max_wait):
+                raise ThrottledError('Accredible calls are throttled')
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self.limiter.release()
+                raise
+            start = time.time()
+            try:
+                response = self.session.request(
+                    method,
+                    self.url(path),
+                    data=data,
+                    params=params,
+                    timeout=self.timeout
+                )
+            except Exception:
+                self.breaker.record(False)
+                raise
+            finally:
+                self.limiter.release()
+            self.breaker.record(
+                response.status_code < 500, time.time() - start)
+            if response.status_code != 429:
+                self.limiter.succeeded()
+                return response
+            self.limiter.throttled(response.headers.get('Retry-After'))
+            attempt += 1
+            if attempt > self.throttle_retries:
+                logger.warning('Accredible throttled {} {} {} times'.format(
+                    method, path, attempt))
+                return response
+
+    def create_credential(self, payload):
+        return self.request('POST', 'credentials', data=payload)
+
+    def bulk_create_credentials(self, payloads):
+        """
+        Create several credentials in one call, ``payloads`` are the bodies
+        create_credential would send.
+        """
+        return self.request(
+            'POST',
+            'credentials/bulk_create',
+            data={"credentials": [payload["credential"] for payload in payloads]}
+        )
+
+    def update_credential(self, credential_id, payload):
+        return self.request(
+            'PUT', 'credentials/' + str(credential_id), data=payload)
+
+    def search_credentials(self, email):
+        return self.request(
+            'POST',
+            'credentials/search',
+            data={"recipient": {"email": email}}
+        )
+
+    def list_credentials(self, achievement_id, full_view=True, **params):
+        params['achievement_id'] = achievement_id
+        if full_view:
+            params['full_view'] = 'true'
+        return self.request('GET', 'credentials', params=params)
+
+    def iter_credentials(self, achievement_id, page_size=None, **params):
+        """
+        Yield every credential of ``achievement_id``, one page at a time.
+
+        Raises ``requests.HTTPError`` when a page can't be fetched, so a
+        partial listing is never mistaken for a complete one.
+        """
+        page_size = page_size or getattr(
+            settings, 'ACCREDIBLE_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+        page = 1
+        while page:
+            response = self.list_credentials(
+                achievement_id, page=page, page_size=page_size, **params)
+            response.raise_for_status()
+            body = response.json()
+            credentials = body.get("credentials") or []
+            for credential in credentials:
+                yield credential
+            meta = body.get("meta") or {}
+            if 'next_page' in meta:
+                page = meta["next_page"]
+            elif len(credentials) < page_size:
+                page = None
+            else:
+                page += 1
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+# Number of processes sharing the Accredible quota, see set_process_share
+_process_share = 1
+# Whether throttled calls wait and are retried, see set_bulk_mode
+_bulk_mode = False
+
+
+def get_client(api_key):
+    """
+    Return the process-wide ``AccredibleClient`` for ``api_key``.
+
+    Unless ``set_bulk_mode`` was called the client never waits out a 429:
+    throttled calls are not retried and raise ``ThrottledError`` rather
+    than wait ``ACCREDIBLE_REQUEST_MAX_WAIT`` seconds for the limiter, so
+    a learner's request is not held while Accredible throttles.
+    """
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            if _bulk_mode:
+                options = {}
+            else:
+                options = {
+                    'throttle_retries': 0,
+                    'max_wait': getattr(
+                        settings, 'ACCREDIBLE_REQUEST_MAX_WAIT',
+                        DEFAULT_REQUEST_MAX_WAIT),
+                }
+            client = _clients[api_key] = AccredibleClient(
+                api_key, share=_process_share, **options)
+        return client
+
+
+def set_bulk_mode(enabled=True):
+    """
+    Let the clients of this process wait for the rate limiter and retry
+    throttled calls, for the management commands working through a course.
+    """
+    global _bulk_mode
+    with _clients_lock:
+        _bulk_mode = enabled
+        _clients.clear()
+
+
+def set_process_share(processes):
+    """
+    Declare this process as one of ``processes`` calling Accredible at the
+    same time, e.g. a child of generate_accredible_certs --processes, so
+    ``ACCREDIBLE_RATE_LIMIT`` and ``ACCREDIBLE_MAX_CONCURRENCY`` hold for
+    all of them together. Clients inherited from a parent are dropped.
+    """
+    global _process_share
+    with _clients_lock:
+        _process_share = max(processes, 1)
+        _clients.clear()
@@ -0,0 +1,101 @@
+"""
+Helpers for running the per-learner issuance stage on a bounded thread pool.
+"""
+import logging
+import sys
+import threading
+from Queue import Queue
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def imap(func, items, workers):
+    """
+    ``imap_threaded`` on ``workers`` threads, or ``imap_serial`` for one.
+    """
+    if workers > 1:
+        return imap_threaded(func, items, workers)
+    return imap_serial(func, items)
+
+
+def imap_serial(func, items):
+    """
+    Apply ``func`` to every element of ``items`` in this thread, yielding
+    the same ``(item, result, exc_info)`` tuples as ``imap_threaded``.
+    """
+    for item in items:
+        try:
+            yield item, func(item), None
+        except Exception:
+            yield item, None, sys.exc_info()
+
+
+def imap_threaded(func, items, workers):
+    """
+    Apply ``func`` to every element of ``items`` on ``workers`` threads.
+
+    Yields ``(item, result, exc_info)`` tuples in completion order, where
+    exactly one of ``result``/``exc_info`` is set. At most ``2 * workers``
+    items are pulled from ``items`` ahead of the consumer, so large lazy
+    iterables are never materialized.
+
+    Every thread (including the one consuming ``items``) gets its own
+    Django database connection, which is closed when the thread exits.
+
+    An exception raised by ``items`` itself is re-raised in the consumer
+    once the items already pulled have been yielded, instead of ending the
+    iteration as if every item had been processed.
+    """
+    inbox = Queue(maxsize=workers * 2)
+    outbox = Queue()
+
+    def worker():
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                try:
+                    outbox.put((item, func(item), None))
+                except Exception:
+                    outbox.put((item, None, sys.exc_info()))
+        finally:
+            connection.close()
+            outbox.put(_DONE)
+
+    threads = [threading.Thread(target=worker) for __ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    feed_error = []
+
+    def feeder():
+        try:
+            for item in items:
+                inbox.put(item)
+        except Exception:
+            feed_error.append(sys.exc_info())
+        finally:
+            connection.close()
+            for __ in threads:
+                inbox.put(_DONE)
+
+    feed = threading.Thread(target=feeder)
+    feed.daemon = True
+    feed.start()
+
+    running = len(threads)
+    while running:
+        result = outbox.get()
+        if result is _DONE:
+            running -= 1
+        else:
+            yield result
+    if feed_error:
+        exc_type, exc_value, exc_traceback = feed_error[0]
+        raise exc_type, exc_value, exc_traceback
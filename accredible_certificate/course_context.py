@@ -0,0 +1,152 @@
+"""
+Per-course data shared by every credential issued for a course.
+
+The course description, cleaned course name, course link and the static
+part of the credential payload are the same for every learner of a course,
+so they are computed once and kept in a small LRU/TTL cache shared by the
+request_certificate view and the management commands.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from courseware import courses
+from django.conf import settings
+from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.exceptions import ItemNotFoundError
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_SECTIONS = ['short_description', 'description', 'overview']
+DEFAULT_DESCRIPTION = "course_description"
+DEFAULT_CACHE_TTL = 300
+DEFAULT_CACHE_SIZE = 128
+
+
+class CourseContext(object):
+    """
+    Learner independent data used to build Accredible credentials.
+    """
+
+    def __init__(self, course_id, course):
+        self.course_id = course_id
+        self.course_id_string = course_id.to_deprecated_string()
+        self.course_name = course.display_name or self.course_id_string
+        self.credential_name = self.clean_name(self.course_name)
+        self.description = self.load_description(course)
+        self.course_link = "/courses/" + self.course_id_string + "/about"
+        self.credential_template = {
+            "name": self.credential_name,
+            "group_name": self.credential_name,
+            "description": self.description,
+            "achievement_id": self.course_id_string,
+            "course_link": self.course_link,
+            "template_name": self.course_id_string,
+        }
+
+    @staticmethod
+    def clean_name(course_name):
+        """
+        Strip the BETA prefix used to flag beta courses.
+        """
+        course_name = course_name.strip()
+        if course_name[:4] in ("BETA", "Beta", "beta"):
+            course_name = course_name[4:].strip()
+        return course_name
+
+    @staticmethod
+    def load_description(course):
+        """
+        Return the first non empty about section of the course.
+        """
+        store = modulestore()
+        for section_key in DESCRIPTION_SECTIONS:
+            loc = course.location.replace(
+                category='about',
+                name=section_key
+            )
+            try:
+                data = store.get_item(loc).data
+            except ItemNotFoundError:
+                logger.debug(
+                    "Course {} has no {} about item".format(
+                        course.id, section_key))
+                continue
+            if data:
+                return data
+        return DEFAULT_DESCRIPTION
+
+    def credential_payload(self, name, email, grade, approve):
+        """
+        Return the payload creating the credential of one learner.
+        """
+        credential = dict(self.credential_template)
+        credential.update({
+            "approve": approve,
+            "grade": grade,
+            "recipient": {
+                "name": name,
+                "email": email
+            }
+        })
+        return {"credential": credential}
+
+
+class ExpiringLRUCache(object):
+    """
+    Thread safe mapping keeping at most ``maxsize`` entries for ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                return None
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time() + self.ttl)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_contexts = ExpiringLRUCache(
+    getattr(settings, 'ACCREDIBLE_COURSE_CONTEXT_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+    getattr(settings, 'ACCREDIBLE_COURSE_CONTEXT_TTL', DEFAULT_CACHE_TTL),
+)
+
+
+def get_course_context(course_id, course=None):
+    """
+    Return the cached ``CourseContext`` of ``course_id``.
+
+    ``course`` is only used (or fetched) when the context is not cached.
+    """
+    context = _contexts.get(course_id)
+    if context is None:
+        if course is None:
+            course = courses.get_course_by_id(course_id)
+        context = CourseContext(course_id, course)
+        _contexts.set(course_id, context)
+    return context
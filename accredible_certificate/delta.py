@@ -0,0 +1,37 @@
+"""
+Selection of the learners whose certificate outcome may have changed since
+a previous generate_accredible_certs run.
+"""
+from django.db.models import Q
+from lms.djangoapps.grades.models import PersistentCourseGrade
+from student.models import CourseEnrollment
+
+
+def watermark_name(course_key, shard=None):
+    """
+    Name of the --delta watermark of a course, or of one of its shards: a
+    shard only processes its own learners, so its run says nothing about
+    the others.
+    """
+    name = 'generate:' + unicode(course_key)
+    if shard is not None:
+        name += ':{}/{}'.format(*shard)
+    return name
+
+
+def changed_since(students, course_key, since, column='id'):
+    """
+    Restrict the ``students`` queryset to learners whose persisted course
+    grade changed, or who enrolled, after ``since``. ``column`` is the user
+    id field of the queryset's model.
+    """
+    graded = PersistentCourseGrade.objects.filter(
+        course_id=course_key,
+        modified__gt=since
+    ).values('user_id')
+    enrolled = CourseEnrollment.objects.filter(
+        course_id=course_key,
+        created__gt=since
+    ).values('user_id')
+    return students.filter(
+        Q(**{column + '__in': graded}) | Q(**{column + '__in': enrolled}))
@@ -0,0 +1,57 @@
+"""
+Course-wide grade computation for bulk certificate runs.
+"""
+from collections import namedtuple
+
+from lms.djangoapps.grades.course_grade_factory import CourseGradeFactory
+from lms.djangoapps.grades.models import PersistentCourseGrade
+
+from accredible_certificate.utils import chunked
+
+GRADE_CHUNK_SIZE = 500
+
+# Minimal stand-in for a CourseGrade built from a persisted grade row,
+# exposes the two attributes add_cert and regen_cert read.
+PersistedGrade = namedtuple('PersistedGrade', ['percent', 'letter_grade'])
+
+
+def iter_course_grades(students, course, use_persisted=False,
+                       chunk_size=GRADE_CHUNK_SIZE, compute=True):
+    """
+    Yield ``(student, course_grade, error)`` for every student.
+
+    Grades are computed with ``CourseGradeFactory().iter``, which collects
+    the course block structure once for all students, reusing the already
+    loaded ``course``. With ``use_persisted`` the stored
+    ``PersistentCourseGrade`` rows are used as they are, and only students
+    without one are graded.
+
+    Computing a grade persists it and sends the grade signals. Without
+    ``compute`` only the persisted grades are read, students without one
+    are yielded with a None course_grade.
+    """
+    factory = CourseGradeFactory()
+    for chunk in chunked(students, chunk_size):
+        if use_persisted or not compute:
+            persisted = dict(
+                (user_id, PersistedGrade(percent, letter_grade))
+                for user_id, percent, letter_grade in
+                PersistentCourseGrade.objects.filter(
+                    course_id=course.id,
+                    user_id__in=[student.id for student in chunk]
+                ).values_list('user_id', 'percent_grade', 'letter_grade')
+            )
+            to_grade = []
+            for student in chunk:
+                if student.id in persisted:
+                    yield student, persisted[student.id], None
+                else:
+                    to_grade.append(student)
+        else:
+            to_grade = chunk
+        if not compute:
+            for student in to_grade:
+                yield student, None, None
+        elif to_grade:
+            for result in factory.iter(to_grade, course=course):
+                yield result.student, result.course_grade, result.error
@@ -0,0 +1,190 @@
+"""
+Durable progress journal of generate_accredible_certs runs.
+
+Every processed learner gets a ``GenerationJournalEntry`` for the course,
+so an interrupted run can be resumed (``--resume``) and learners that
+failed can be processed again on their own (``--retry-failed``).
+
+Every run claims a learner in the journal before issuing, so overlapping
+runs (e.g. shards, ``--shard K/N``, sharing the journal of the course)
+never issue the same certificate. A new run only resets the learners of
+its shard, and keeps the claims other runs still hold.
+
+Runs go through the enrollments in chunks and checkpoint the last
+enrollment of every finished chunk, --resume starts after it.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from accredible_certificate.models import GenerationCheckpoint, GenerationJournalEntry
+from accredible_certificate.sharding import in_shard
+
+JOURNAL_FLUSH_SIZE = 100
+# A claim older than this was left by a run that stopped, a learner is
+# claimed just before issuing and recorded within a journal flush
+CLAIM_LEASE = timedelta(hours=1)
+
+
+class GenerationJournal(object):
+    """
+    Journal of the learners processed for one course.
+
+    Outcomes are buffered and written every ``flush_size`` learners, a
+    crash loses at most that many entries, whose learners are then simply
+    processed again.
+    """
+
+    def __init__(self, course_key, flush_size=JOURNAL_FLUSH_SIZE, shard=None,
+                 before_flush=None):
+        self.course_id = unicode(course_key)
+        self.flush_size = flush_size
+        self.shard = shard
+        # called before entries are written, e.g. to write the buffered
+        # certificates they describe first
+        self.before_flush = before_flush
+        self._pending = {}
+
+    @property
+    def entries(self):
+        """
+        Entries of the learners of this journal's shard.
+        """
+        return in_shard(
+            GenerationJournalEntry.objects.filter(course_id=self.course_id),
+            self.shard,
+            'user_id'
+        )
+
+    @property
+    def shard_name(self):
+        return '' if self.shard is None else '{}/{}'.format(*self.shard)
+
+    def reset(self):
+        """
+        Forget the previous run, a new run processes every learner.
+
+        Claims younger than CLAIM_LEASE are kept, the runs holding them
+        may still be issuing those learners.
+        """
+        self.entries.exclude(
+            outcome=GenerationJournalEntry.CLAIMED,
+            modified__gte=timezone.now() - CLAIM_LEASE
+        ).delete()
+        checkpoints = GenerationCheckpoint.objects.filter(
+            course_id=self.course_id)
+        if self.shard is not None:
+            checkpoints = checkpoints.filter(shard=self.shard_name)
+        checkpoints.delete()
+
+    def checkpoint(self):
+        """
+        Id of the enrollment up to which the previous run processed every
+        learner, or None.
+        """
+        return GenerationCheckpoint.objects.filter(
+            course_id=self.course_id,
+            shard=self.shard_name
+        ).values_list('enrollment_id', flat=True).first()
+
+    def save_checkpoint(self, enrollment_id):
+        """
+        Mark every learner up to ``enrollment_id`` as processed.
+        """
+        self.flush()
+        GenerationCheckpoint.objects.update_or_create(
+            course_id=self.course_id,
+            shard=self.shard_name,
+            defaults={'enrollment_id': enrollment_id}
+        )
+
+    def processed_user_ids(self):
+        """
+        Learners with an outcome, claimed learners the run didn't finish
+        are left to --resume.
+        """
+        return self.entries.exclude(
+            outcome=GenerationJournalEntry.CLAIMED
+        ).values('user_id')
+
+    def failed_user_ids(self):
+        """
+        Learners that failed, or were claimed by a run that didn't finish.
+        """
+        return self.entries.filter(outcome__in=[
+            GenerationJournalEntry.FAILED,
+            GenerationJournalEntry.CLAIMED,
+        ]).values('user_id')
+
+    def claim(self, user_id, takeover=()):
+        """
+        Reserve ``user_id`` for this run. Returns False when another run
+        already has an entry for the learner and it must be skipped.
+
+        Entries whose outcome is in ``takeover`` (e.g. failures, for
+        --retry-failed) are claimed instead of skipped.
+        """
+        if takeover and GenerationJournalEntry.objects.filter(
+                course_id=self.course_id,
+                user_id=user_id,
+                outcome__in=takeover
+        ).update(
+            outcome=GenerationJournalEntry.CLAIMED,
+            # update() bypasses auto_now, the claim starts a new lease
+            modified=timezone.now()
+        ):
+            return True
+        try:
+            with transaction.atomic():
+                GenerationJournalEntry.objects.create(
+                    course_id=self.course_id,
+                    user_id=user_id,
+                    outcome=GenerationJournalEntry.CLAIMED
+                )
+        except IntegrityError:
+            return False
+        return True
+
+    def summary(self):
+        """
+        Number of learners per outcome for the whole course, all shards.
+        """
+        return dict(
+            GenerationJournalEntry.objects.filter(
+                course_id=self.course_id
+            ).values_list('outcome').annotate(Count('id'))
+        )
+
+    def record(self, user_id, result=None, error=None):
+        """
+        Record the outcome of ``user_id``, a failure when ``error`` is set.
+        """
+        self._pending[user_id] = (
+            GenerationJournalEntry.FAILED if error is not None
+            else GenerationJournalEntry.DONE,
+            u'' if result is None else unicode(result),
+            error or u'',
+        )
+        if len(self._pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if self.before_flush is not None:
+            self.before_flush()
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        with transaction.atomic():
+            self.entries.filter(user_id__in=pending.keys()).delete()
+            GenerationJournalEntry.objects.bulk_create([
+                GenerationJournalEntry(
+                    course_id=self.course_id,
+                    user_id=user_id,
+                    outcome=outcome,
+                    result=result[:64],
+                    error=error,
+                )
+                for user_id, (outcome, result, error) in pending.items()
+            ])
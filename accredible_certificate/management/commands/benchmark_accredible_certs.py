@@ -0,0 +1,258 @@
+"""
+Management command measuring the throughput of certificate issuance against
+a local fake Accredible API, with synthetic learners.
+"""
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from lms.djangoapps.certificates.models import GeneratedCertificate
+from lms.djangoapps.grades.models import PersistentCourseGrade
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey
+from student.models import CourseEnrollment, UserProfile
+
+from accredible_certificate import metrics
+from accredible_certificate.benchmark.fake_server import FakeAccredible, FakeAccredibleServer
+from accredible_certificate.benchmark.recorder import RecordingSink, percentile
+from accredible_certificate.client import set_bulk_mode
+from accredible_certificate.delta import watermark_name as delta_watermark_name
+from accredible_certificate.models import (
+    AccredibleCredential,
+    AccredibleWatermark,
+    GenerationCheckpoint,
+    GenerationJournalEntry
+)
+from accredible_certificate.mirror import watermark_name
+from accredible_certificate.queue import request_certificate_for
+
+
+class Command(BaseCommand):
+    help = """
+    Benchmark generate_accredible_certs, change_accredible_certs_status and
+    the request_certificate flow against a local fake Accredible API.
+
+    Synthetic learners, enrollments and persisted grades are created in the
+    given course and deleted afterwards, along with every certificate,
+    credential, journal entry and checkpoint of the course. The course must
+    therefore have no enrollment nor certificate data before the run, use a
+    throwaway course on a disposable (devstack or load test) database.
+    Query counts only cover the main thread, use --workers 1 when comparing
+    them.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--course', metavar='COURSE_ID', dest='course',
+                            help='Existing course without enrollments to enroll the synthetic learners in')
+        parser.add_argument('-n', '--students', type=int, default=500,
+                            help='Number of synthetic learners')
+        parser.add_argument('--pass-rate', type=float, default=0.7,
+                            help='Share of learners with a passing grade')
+        parser.add_argument('--latency', type=float, default=50,
+                            help='Fake API latency in milliseconds')
+        parser.add_argument('--error-rate', type=float, default=0,
+                            help='Share of fake API calls answered with a 503')
+        parser.add_argument('--throttle-rate', type=float, default=0,
+                            help='Share of fake API calls answered with a 429')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Number of request_certificate calls to time')
+        parser.add_argument('-w', '--workers', type=int, default=1)
+        parser.add_argument('-b', '--batch-size', dest='batch_size', type=int, default=0)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if not options['course']:
+            raise CommandError("You must specify a course")
+        try:
+            course_key = CourseKey.from_string(options['course'])
+        except InvalidKeyError:
+            raise CommandError("Invalid course id {}".format(options['course']))
+        self.check_course_is_empty(course_key)
+
+        api = FakeAccredible(
+            latency=options['latency'] / 1000.0,
+            error_rate=options['error_rate'],
+            throttle_rate=options['throttle_rate'],
+            retry_after=0.2,
+            seed=options['seed'],
+        )
+        server = FakeAccredibleServer(api).start()
+        # A fresh api key gets its own client, pointed at the fake server
+        api_key = 'benchmark-' + uuid.uuid4().hex
+        prefix = 'acc-bench-{}-'.format(uuid.uuid4().hex[:8])
+        sink = RecordingSink()
+        previous_sink, metrics._sink = metrics._sink, sink
+
+        rows = []
+        try:
+            with override_settings(ACCREDIBLE_API_URL=server.url):
+                students = self.create_learners(
+                    course_key, prefix, options['students'],
+                    options['pass_rate'], random.Random(options['seed']))
+
+                rows.append(self.measure(
+                    'generate', len(students), api, sink,
+                    'accredible.add_cert.duration',
+                    lambda: call_command(
+                        'generate_accredible_certs',
+                        course=unicode(course_key),
+                        api_key=api_key,
+                        styling='True',
+                        persisted_grades=True,
+                        workers=options['workers'],
+                        batch_size=options['batch_size'],
+                    )
+                ))
+
+                api.approve_all()
+                rows.append(self.measure(
+                    'change_status', len(students), api, sink, None,
+                    lambda: call_command(
+                        'change_accredible_certs_status',
+                        course=unicode(course_key),
+                        api_key=api_key,
+                    )
+                ))
+
+                sample = students[:options['requests']]
+
+                # The generate run switched the process to bulk mode, the
+                # request path is timed with the client the LMS uses
+                set_bulk_mode(False)
+
+                def request_all():
+                    for student in sample:
+                        request_certificate_for(student, course_key, api_key)
+
+                rows.append(self.measure(
+                    'request_certificate', len(sample), api, sink,
+                    'accredible.request.duration', request_all
+                ))
+        finally:
+            metrics._sink = previous_sink
+            server.shutdown()
+            self.delete_learners(course_key, prefix)
+
+        self.report(rows)
+
+    def course_data(self, course_key):
+        """
+        Querysets of the data of ``course_key`` a run creates or deletes.
+        """
+        course_id = unicode(course_key)
+        achievement_id = course_key.to_deprecated_string()
+        return [
+            ('enrollments', CourseEnrollment.objects.filter(course_id=course_key)),
+            ('persisted grades', PersistentCourseGrade.objects.filter(course_id=course_key)),
+            ('certificates', GeneratedCertificate.objects.filter(course_id=course_key)),
+            ('journal entries', GenerationJournalEntry.objects.filter(course_id=course_id)),
+            ('checkpoints', GenerationCheckpoint.objects.filter(course_id=course_id)),
+            ('credentials', AccredibleCredential.objects.filter(achievement_id=achievement_id)),
+            ('watermarks', AccredibleWatermark.objects.filter(
+                name__in=[watermark_name(achievement_id), delta_watermark_name(course_key)])),
+        ]
+
+    def check_course_is_empty(self, course_key):
+        """
+        Refuse to run on a course with real learners: the run would count
+        them in its rates, and its cleanup would delete their data.
+        """
+        found = [
+            name for name, queryset in self.course_data(course_key)
+            if queryset.exists()
+        ]
+        if found:
+            raise CommandError(
+                "Course {} already has {}, benchmark on a course without"
+                " enrollments nor certificate data".format(
+                    course_key, ', '.join(found)))
+
+    def create_learners(self, course_key, prefix, count, pass_rate, rand):
+        User.objects.bulk_create([
+            User(username=prefix + str(i), email=prefix + str(i) + '@example.com')
+            for i in range(count)
+        ])
+        students = list(User.objects.filter(username__startswith=prefix).order_by('id'))
+        UserProfile.objects.bulk_create([
+            UserProfile(user=student, name='Learner ' + student.username)
+            for student in students
+        ])
+        CourseEnrollment.objects.bulk_create([
+            CourseEnrollment(user=student, course_id=course_key, mode='honor', is_active=True)
+            for student in students
+        ])
+        now = timezone.now()
+        grades = []
+        for student in students:
+            passed = rand.random() < pass_rate
+            grades.append(PersistentCourseGrade(
+                user_id=student.id,
+                course_id=course_key,
+                course_version='',
+                grading_policy_hash='',
+                percent_grade=rand.uniform(0.6, 1.0) if passed else rand.uniform(0, 0.5),
+                letter_grade='Pass' if passed else '',
+                passed_timestamp=now if passed else None,
+            ))
+        PersistentCourseGrade.objects.bulk_create(grades)
+        return students
+
+    def delete_learners(self, course_key, prefix):
+        # check_course_is_empty made sure the course data is all synthetic
+        users = User.objects.filter(username__startswith=prefix)
+        user_ids = list(users.values_list('id', flat=True))
+        for __, queryset in reversed(self.course_data(course_key)):
+            queryset.delete()
+        UserProfile.objects.filter(user_id__in=user_ids).delete()
+        users.delete()
+
+    @contextmanager
+    def quiet(self):
+        stdout, sys.stdout = sys.stdout, open('/dev/null', 'w')
+        try:
+            yield
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    def measure(self, name, learners, api, sink, timing, func):
+        api.reset_calls()
+        sink.timings.pop(timing, None)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            with self.quiet():
+                func()
+            elapsed = time.time() - start
+        latencies = sink.timings.get(timing, [])
+        return {
+            'scenario': name,
+            'learners': learners,
+            'seconds': elapsed,
+            'rate': learners / elapsed if elapsed else 0,
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'queries': len(queries),
+            'api_calls': api.total_calls,
+        }
+
+    def report(self, rows):
+        def ms(value):
+            return '-' if value is None else '{:.1f}'.format(value)
+
+        print('{:<20} {:>8} {:>8} {:>10} {:>8} {:>8} {:>8} {:>9} {:>9}'.format(
+            'scenario', 'learners', 'seconds', 'learners/s', 'p50 ms', 'p99 ms',
+            'queries', 'q/learner', 'api/learn'))
+        for row in rows:
+            learners = row['learners'] or 1
+            print('{:<20} {:>8} {:>8.1f} {:>10.1f} {:>8} {:>8} {:>8} {:>9.2f} {:>9.2f}'.format(
+                row['scenario'], row['learners'], row['seconds'], row['rate'],
+                ms(row['p50']), ms(row['p99']), row['queries'],
+                row['queries'] / float(learners), row['api_calls'] / float(learners)))
@@ -1,9 +1,16 @@
 from django.core.management.base import BaseCommand, CommandError
 from lms.djangoapps.certificates.models import certificate_status_for_student
 from accredible_certificate.queue import CertificateGeneration
+from accredible_certificate.client import get_client, set_bulk_mode
+from accredible_certificate.mirror import approved_emails as mirrored_approved_emails
+from accredible_certificate.mirror import sync_course
+from accredible_certificate.utils import chunked
+from accredible_certificate import metrics
+from accredible_certificate import status_cache
 from django.contrib.auth.models import User
 from optparse import make_option
 from django.conf import settings
+from django.utils import timezone
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
 from opaque_keys.edx.locations import SlashSeparatedCourseKey
@@ -13,9 +20,10 @@ from lms.djangoapps.certificates.models import CertificateStatuses
 from lms.djangoapps.certificates.models import GeneratedCertificate
 import datetime
 from pytz import UTC
-import requests
 import json
 
+UPDATE_CHUNK_SIZE = 500
+
 
 class Command(BaseCommand):
     help = """
@@ -42,8 +50,17 @@ class Command(BaseCommand):
             default=None,
             help='API key for accredible Certificate, if don\'t have one'
             'Visit https://accredible.com/issuer/sign_up and get one')
+        parser.add_argument(
+            '--full-sync',
+            action='store_true',
+            dest='full_sync',
+            default=False,
+            help='Re-download every credential of the course instead of '
+            'only the ones changed since the last sync')
 
     def handle(self, *args, **options):
+        # Throttled calls wait and are retried, no learner waits on a command
+        set_bulk_mode()
 
         # Will only generate a certificate if the current
         # status is in the unavailable state, can be set
@@ -66,14 +83,45 @@ class Command(BaseCommand):
         else:
             raise CommandError(
                 "You must give a api_key, if don't have one visit: https://accredible.com/issuer/sign_up")
-        user_emails = []
-        r = requests.get("https://api.accredible.com/v1/credentials?achievement_id=" + course_id.to_deprecated_string(
-        ) + "&&full_view=true", headers={'Authorization': 'Token token=' + api_key, 'Content-Type': 'application/json'})
-        for certificate in r.json()["credentials"]:
-            if certificate["approve"] == True:
-                user_emails.append(certificate["recipient"]["email"])
-        for certificate in GeneratedCertificate.objects.filter(course_id=course_id, status="generating"):
-            if certificate.user.email in user_emails:
-                certificate.status = "downloadable"
-                certificate.save()
-                print certificate.name
+
+        # Bring the local credential mirror up to date, then read the
+        # approved recipients from it
+        achievement_id = course_id.to_deprecated_string()
+        with metrics.timed('change_status.sync', course_id):
+            synced = sync_course(
+                get_client(api_key), achievement_id, full=options['full_sync'])
+        approved_emails = mirrored_approved_emails(achievement_id)
+
+        pending = GeneratedCertificate.objects.filter(
+            course_id=course_id,
+            status=CertificateStatuses.generating
+        ).values_list('id', 'user_id', 'name', 'user__email')
+        pending_count = 0
+        approved_ids = []
+        approved_user_ids = []
+        with metrics.timed('change_status.db', course_id):
+            for certificate_id, user_id, name, email in pending.iterator():
+                pending_count += 1
+                if email in approved_emails:
+                    approved_ids.append(certificate_id)
+                    approved_user_ids.append(user_id)
+                    print name
+
+            for chunk in chunked(approved_ids, UPDATE_CHUNK_SIZE):
+                GeneratedCertificate.objects.filter(
+                    id__in=chunk,
+                    status=CertificateStatuses.generating
+                ).update(
+                    status=CertificateStatuses.downloadable,
+                    # update() bypasses auto_now
+                    modified_date=timezone.now()
+                )
+            for chunk in chunked(approved_user_ids, UPDATE_CHUNK_SIZE):
+                status_cache.invalidate_many(chunk, course_id)
+        metrics.increment(
+            'change_status.updated', course_id, value=len(approved_ids))
+
+        print("{0} credentials synced, {1} approved; {2} generating "
+              "certificates, {3} changed to downloadable".format(
+                  synced, len(approved_emails), pending_count,
+                  len(approved_ids)))
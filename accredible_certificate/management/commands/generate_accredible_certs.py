@@ -4,20 +4,84 @@ courses that have finished, and put their cert requests to the Accredible API.
 """
 from django.core.management.base import BaseCommand, CommandError
 from lms.djangoapps.certificates.models import certificate_status_for_student
-from accredible_certificate.queue import CertificateGeneration
-from django.contrib.auth.models import User
+from accredible_certificate.queue import (
+    CertificateGeneration, ISSUE, certificate_outcome, grade_points)
+from accredible_certificate.client import (
+    DEFAULT_MAX_CONCURRENCY, DEFAULT_RATE_LIMIT, set_bulk_mode, set_process_share)
+from accredible_certificate.concurrency import imap
+from accredible_certificate.prefetch import CourseEligibility
+from accredible_certificate.grades import iter_course_grades
+from accredible_certificate.journal import GenerationJournal
+from accredible_certificate.writer import CertificateWriter
+from accredible_certificate.utils import chunked, keyset_chunks
+from accredible_certificate import metrics
+from accredible_certificate.delta import changed_since, watermark_name
+from accredible_certificate.models import AccredibleWatermark, GenerationJournalEntry
+from accredible_certificate.sharding import in_shard, parse_shard
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django import db
+from student.models import CourseEnrollment
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 from optparse import make_option
 from django.conf import settings
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
 from opaque_keys.edx.locations import SlashSeparatedCourseKey
 from xmodule.course_module import CourseDescriptor
-from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.django import clear_existing_modulestores, modulestore
 from lms.djangoapps.certificates.models import CertificateStatuses
 import datetime
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import traceback
 from pytz import UTC
 
 
+# Options generate_for_course reads, passed to the course processes
+RUN_OPTIONS = (
+    'workers', 'batch_size', 'persisted_grades', 'resume', 'retry_failed',
+    'delta', 'chunk_size', 'plan', 'plan_output', 'call_latency',
+)
+
+# Accredible call latency assumed by --plan, in milliseconds
+DEFAULT_CALL_LATENCY = 500
+
+# --plan outcome of students whose status is not in the regenerated ones
+UNCHANGED = 'unchanged'
+# --plan outcome of students without a persisted grade
+UNGRADED = 'ungraded'
+
+# Enrollments loaded, graded and issued at a time
+DEFAULT_CHUNK_SIZE = 1000
+
+# The enrollment's user and the User columns add_cert and grading read,
+# the rest is not loaded
+STUDENT_FIELDS = (
+    'user', 'user__id', 'user__username', 'user__email', 'user__is_active',
+    'user__is_staff', 'user__is_superuser',
+)
+
+
+# Returned instead of a status for learners claimed by another run
+SKIPPED = 'skipped'
+
+
+def _init_course_process(processes):
+    # The modulestore connections inherited from the parent are not fork safe
+    clear_existing_modulestores()
+    # The Accredible rate limit and concurrency are split between the pool
+    set_process_share(processes)
+
+
+def _generate_course_in_process(args):
+    course_id, run = args
+    return Command().generate_course_safely(CourseKey.from_string(course_id), run)
+
+
 class Command(BaseCommand):
     help = """
     Find all students that need certificates for courses that have finished and
@@ -33,9 +97,23 @@ class Command(BaseCommand):
             '-c', '--course',
             metavar='COURSE_ID',
             dest='course',
-            default=False,
+            action='append',
+            default=[],
             help='Grade and generate certificates '
-            'for a specific course'),
+            'for a specific course, can be repeated'),
+        parser.add_argument('--all-ended',
+                            action='store_true',
+                            dest='all_ended',
+                            default=False,
+                            help='Grade and generate certificates for every'
+                            ' course that has ended.'),
+        parser.add_argument('-p', '--processes',
+                            metavar='N',
+                            dest='processes',
+                            type=int,
+                            default=1,
+                            help='Process up to N courses in parallel, each'
+                            ' in its own process with --workers threads.'),
         parser.add_argument('-a', '--api_key',
                             metavar='API_KEY',
                             dest='api_key',
@@ -65,8 +143,97 @@ class Command(BaseCommand):
                             'Then Run xyz command after that student '
                             'will be informed and'
                             ' can certificate on their dashboard'),
+        parser.add_argument('-w', '--workers',
+                            metavar='N',
+                            dest='workers',
+                            type=int,
+                            default=1,
+                            help='Grade and issue certificates on N threads'
+                            ' in parallel. Defaults to 1 (serial).'),
+        parser.add_argument('--persisted-grades',
+                            action='store_true',
+                            dest='persisted_grades',
+                            default=False,
+                            help='Use the persisted course grades instead'
+                            ' of recomputing them, students without a'
+                            ' persisted grade are still graded.'),
+        parser.add_argument('-b', '--batch-size',
+                            metavar='N',
+                            dest='batch_size',
+                            type=int,
+                            default=0,
+                            help='Create the credentials of N students at a'
+                            ' time with the Accredible bulk create call.'),
+        parser.add_argument('--chunk-size',
+                            metavar='N',
+                            dest='chunk_size',
+                            type=int,
+                            default=DEFAULT_CHUNK_SIZE,
+                            help='Load and process the enrollments N at a'
+                            ' time, every finished chunk is a checkpoint'
+                            ' for --resume. Defaults to {}.'.format(
+                                DEFAULT_CHUNK_SIZE)),
+        parser.add_argument('--since',
+                            metavar='DATETIME',
+                            dest='since',
+                            default=None,
+                            help='Only process students whose persisted grade'
+                            ' changed or who enrolled after DATETIME'
+                            ' (ISO 8601).'),
+        parser.add_argument('--delta',
+                            action='store_true',
+                            dest='delta',
+                            default=False,
+                            help='Only process students whose persisted grade'
+                            ' changed or who enrolled since the last run of'
+                            ' the course without failures.'),
+        parser.add_argument('--shard',
+                            metavar='K/N',
+                            dest='shard',
+                            default=None,
+                            help='Only process the students whose user id is'
+                            ' K modulo N, to split a course between N hosts.'
+                            ' K goes from 0 to N-1.'),
+        parser.add_argument('--resume',
+                            action='store_true',
+                            dest='resume',
+                            default=False,
+                            help='Continue the previous run of the course,'
+                            ' skipping the students it already processed.'),
+        parser.add_argument('--retry-failed',
+                            action='store_true',
+                            dest='retry_failed',
+                            default=False,
+                            help='Only process the students that failed in'
+                            ' the previous run of the course.'),
+        parser.add_argument('--plan',
+                            action='store_true',
+                            dest='plan',
+                            default=False,
+                            help='Only report what the run would do: list'
+                            ' the certificates it would issue, restrict or'
+                            ' mark notpassing from the persisted grades,'
+                            ' without Accredible calls or database writes.'),
+        parser.add_argument('--plan-output',
+                            metavar='PATH',
+                            dest='plan_output',
+                            default=None,
+                            help='Write the --plan list, one JSON object per'
+                            ' student, to PATH instead of stdout.'),
+        parser.add_argument('--call-latency',
+                            metavar='MS',
+                            dest='call_latency',
+                            type=float,
+                            default=DEFAULT_CALL_LATENCY,
+                            help='Accredible call latency the --plan runtime'
+                            ' estimate uses, e.g. the p50 of'
+                            ' accredible.api.create.duration or of'
+                            ' benchmark_accredible_certs. Defaults to'
+                            ' {}ms.'.format(DEFAULT_CALL_LATENCY)),
 
     def handle(self, *args, **options):
+        # Throttled calls wait and are retried, no learner waits on a command
+        set_bulk_mode()
 
         # Will only generate a certificate if the current
         # status is in the unavailable state, can be set
@@ -77,18 +244,31 @@ class Command(BaseCommand):
         else:
             valid_statuses = [CertificateStatuses.unavailable]
 
-        if options['course']:
+        courses = options['course']
+        if isinstance(courses, basestring):
+            courses = [courses]
+        ended_courses = []
+        for course_id in courses:
             # try to parse out the course from the serialized form
             try:
-                course = CourseKey.from_string(options['course'])
+                course = CourseKey.from_string(course_id)
             except InvalidKeyError:
                 print("Course id {} could not be parsed as a CourseKey; falling back to SSCK.from_dep_str".format(
-                    options['course']))
+                    course_id))
                 course = SlashSeparatedCourseKey.from_deprecated_string(
-                    options['course']
+                    course_id
                 )
-            ended_courses = [course]
-        else:
+            ended_courses.append(course)
+        if options['all_ended']:
+            # CourseOverview has the end dates, loading every course from
+            # the modulestore only to call has_ended() is slow
+            ended_courses.extend(
+                course_key for course_key in CourseOverview.objects.filter(
+                    end__lt=timezone.now()
+                ).order_by('id').values_list('id', flat=True)
+                if course_key not in ended_courses
+            )
+        if not ended_courses:
             raise CommandError("You must specify a course")
         if options['api_key']:
             api_key = options['api_key']
@@ -103,23 +283,459 @@ class Command(BaseCommand):
                     "You must give true if want to do styling, no any other argument")
         else:
             new_status = "downloadable"
-        for course_key in ended_courses:
-            # prefetch all chapters/sequentials by saying depth=2
-            course = modulestore().get_course(course_key, depth=2)
-            print "Fetching enrolled students for {0}".format(
-                course_key.to_deprecated_string()
+        if options['resume'] and options['retry_failed']:
+            raise CommandError(
+                "--resume and --retry-failed can't be used together")
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(
+                    "Could not parse --since {}".format(options['since']))
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, UTC)
+        shard = None
+        if options['shard']:
+            try:
+                shard = parse_shard(options['shard'])
+            except ValueError:
+                raise CommandError(
+                    "--shard must be K/N with 0 <= K < N, got {}".format(
+                        options['shard']))
+        # Where plan_course writes its JSON lines when there is no
+        # --plan-output
+        self.plan_stream = sys.stdout
+        if options['plan']:
+            # Courses are planned one after the other in this process,
+            # appending to the same list
+            options['processes'] = 1
+            if options['plan_output']:
+                open(options['plan_output'], 'w').close()
+            else:
+                # Keep stdout valid JSON lines, progress and summaries go
+                # to stderr
+                sys.stdout = sys.stderr
+        run = {
+            'shard': shard,
+            'api_key': api_key,
+            'new_status': new_status,
+            'valid_statuses': valid_statuses,
+            'since': since,
+            'options': dict(
+                (key, options[key]) for key in RUN_OPTIONS),
+        }
+        try:
+            self.generate_for_courses(ended_courses, run, options['processes'])
+        finally:
+            sys.stdout = self.plan_stream
+
+    def generate_for_courses(self, ended_courses, run, processes=1):
+        """
+        Process every course, on a pool of ``processes`` processes.
+        """
+        if len(ended_courses) == 1:
+            self.generate_for_course(ended_courses[0], run)
+            return
+
+        if processes > 1:
+            # Children must open their own database connections
+            db.connections.close_all()
+            processes = min(processes, len(ended_courses))
+            pool = multiprocessing.Pool(
+                processes,
+                initializer=_init_course_process,
+                initargs=(processes,)
             )
-            enrolled_students = User.objects.filter(
-                courseenrollment__course_id=course_key)
-            xq = CertificateGeneration(api_key=api_key)
-            total = enrolled_students.count()
-            print "Total number of students: " + str(total)
-            for student in enrolled_students:
-                if certificate_status_for_student(student, course_key)['status'] in valid_statuses:
-                    ret = xq.add_cert(
+            try:
+                summaries = pool.map(
+                    _generate_course_in_process,
+                    [(unicode(course_key), run) for course_key in ended_courses],
+                    chunksize=1
+                )
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            summaries = [
+                self.generate_course_safely(course_key, run)
+                for course_key in ended_courses
+            ]
+        self.print_summary(summaries)
+
+    def generate_course_safely(self, course_key, run):
+        """
+        generate_for_course, reporting a failure of the course in its
+        summary instead of aborting the other courses.
+        """
+        try:
+            return self.generate_for_course(course_key, run)
+        except Exception:
+            error = traceback.format_exc()
+            print("Failed to process course {0}:\n{1}".format(course_key, error))
+            return {'course_id': unicode(course_key), 'error': error}
+
+    def print_summary(self, summaries):
+        totals = dict.fromkeys(['total', 'processed', 'failed', 'elapsed'], 0)
+        print("{0:<50} {1:>8} {2:>9} {3:>8} {4:>9}".format(
+            'course', 'students', 'processed', 'failures', 'seconds'))
+        for summary in summaries:
+            if 'error' in summary:
+                print("{0:<50} {1}".format(summary['course_id'], 'FAILED'))
+                continue
+            for key in totals:
+                totals[key] += summary[key]
+            print("{0:<50} {1:>8} {2:>9} {3:>8} {4:>9.1f}".format(
+                summary['course_id'], summary['total'], summary['processed'],
+                summary['failed'], summary['elapsed']))
+        print("{0} courses ({1} failed), {2} of {3} students processed,"
+              " {4} failures".format(
+                  len(summaries),
+                  len([summary for summary in summaries if 'error' in summary]),
+                  totals['processed'], totals['total'], totals['failed']))
+
+    def generate_for_course(self, course_key, run):
+        """
+        Grade the students of one course and issue their certificates.
+
+        Returns a summary of the course: total, processed, failed, elapsed.
+        """
+        options = run['options']
+        api_key = run['api_key']
+        new_status = run['new_status']
+        valid_statuses = run['valid_statuses']
+        since = run['since']
+        shard = run['shard']
+
+        # prefetch all chapters/sequentials by saying depth=2
+        course = modulestore().get_course(course_key, depth=2)
+        print "Fetching enrolled students for {0}".format(
+            course_key.to_deprecated_string()
+        )
+        enrollments = in_shard(
+            CourseEnrollment.objects.filter(course_id=course_key),
+            shard,
+            'user_id'
+        )
+        run_started = timezone.now()
+        course_since = since
+        if options['delta'] and course_since is None:
+            course_since = AccredibleWatermark.get(
+                watermark_name(course_key, shard))
+        if course_since is not None:
+            print "Only students changed since {0}".format(course_since)
+            enrollments = changed_since(
+                enrollments, course_key, course_since, 'user_id')
+        # Certificates are written in batches, always before the journal
+        # entries (and checkpoints) saying their learners were processed
+        writer = CertificateWriter()
+        journal = GenerationJournal(
+            course_key, shard=shard, before_flush=writer.flush)
+        after = None
+        if options['resume']:
+            after = journal.checkpoint()
+            enrollments = enrollments.exclude(
+                user_id__in=journal.processed_user_ids())
+        elif options['retry_failed']:
+            enrollments = enrollments.filter(
+                user_id__in=journal.failed_user_ids())
+        elif not options['plan']:
+            journal.reset()
+        # Enrollments are streamed in keyset chunks, each with its own
+        # eligibility data, so memory doesn't grow with the course size
+        students = enrollments.select_related('user').only(*STUDENT_FIELDS)
+        if options['plan']:
+            return self.plan_course(course_key, course, students, after, run)
+        current = {}
+
+        # CertificateGeneration keeps per-call state on self.request,
+        # so every thread gets its own instance
+        local = threading.local()
+
+        def get_xq():
+            xq = getattr(local, 'xq', None)
+            if xq is None:
+                xq = local.xq = CertificateGeneration(
+                    api_key=api_key, writer=writer)
+            return xq
+
+        # Every student is claimed in the journal first, so overlapping
+        # runs and shards never issue the same certificate twice. Claims
+        # left by the interrupted run are taken over by --resume.
+        if options['retry_failed']:
+            takeover = (GenerationJournalEntry.FAILED,
+                        GenerationJournalEntry.CLAIMED)
+        elif options['resume']:
+            takeover = (GenerationJournalEntry.CLAIMED,)
+        else:
+            takeover = ()
+
+        def claimed_elsewhere(student):
+            return not journal.claim(student.id, takeover)
+
+        def issue(graded):
+            student, grade, error = graded
+            if error is not None:
+                raise error
+            if claimed_elsewhere(student):
+                return SKIPPED
+            return get_xq().add_cert(
+                student,
+                course_key,
+                new_status,
+                course=course,
+                context=current['eligibility'].for_student(student),
+                course_grade=grade
+            )
+
+        def issue_batch(batch):
+            xq = get_xq()
+            results = []
+            pendings = []
+            for graded in batch:
+                student, grade, error = graded
+                try:
+                    if error is not None:
+                        raise error
+                    if claimed_elsewhere(student):
+                        results.append((graded, SKIPPED, None))
+                        continue
+                    pending = xq.prepare_cert(
                         student,
                         course_key,
                         new_status,
-                        course=course
+                        course=course,
+                        context=current['eligibility'].for_student(student),
+                        course_grade=grade
                     )
-                    print ret
+                except Exception:
+                    results.append((graded, None, sys.exc_info()))
+                    continue
+                if pending.payload is None:
+                    results.append((graded, pending.status, None))
+                else:
+                    pendings.append((graded, pending))
+            if pendings:
+                statuses = xq.create_certs(
+                    [pending for __, pending in pendings], new_status)
+                results.extend(
+                    (graded, ret, None)
+                    for (graded, __), ret in zip(pendings, statuses)
+                )
+            return results
+
+        start = time.time()
+        total = processed = failed = skipped = 0
+        try:
+            for enrollment_chunk in keyset_chunks(
+                    students, options['chunk_size'], after):
+                chunk_students = [
+                    enrollment.user for enrollment in enrollment_chunk]
+                total += len(chunk_students)
+                current['eligibility'] = CourseEligibility(
+                    course_key,
+                    [student.id for student in chunk_students]
+                )
+                # Only students whose certificate can be (re)generated are
+                # graded, in batch, while the workers issue the credentials
+                candidates = (
+                    student for student in chunk_students
+                    if current['eligibility'].for_student(student).status
+                    in valid_statuses
+                )
+                graded = iter_course_grades(
+                    candidates,
+                    course,
+                    use_persisted=options['persisted_grades']
+                )
+                if options['batch_size'] > 0:
+                    results = self._flatten_batches(imap(
+                        issue_batch,
+                        chunked(graded, options['batch_size']),
+                        options['workers']
+                    ))
+                else:
+                    results = imap(issue, graded, options['workers'])
+                for (student, __, __), ret, exc_info in results:
+                    if ret == SKIPPED:
+                        skipped += 1
+                        continue
+                    processed += 1
+                    if exc_info is not None:
+                        failed += 1
+                        error = ''.join(traceback.format_exception(*exc_info))
+                        print("Failed to process {0}:\n{1}".format(
+                            student.username, error))
+                        journal.record(student.id, error=error)
+                    elif ret == "errors":
+                        failed += 1
+                        print ret
+                        journal.record(
+                            student.id, ret,
+                            error="Accredible API call failed")
+                    else:
+                        print ret
+                        journal.record(student.id, ret)
+                if not options['retry_failed']:
+                    journal.save_checkpoint(enrollment_chunk[-1].pk)
+        finally:
+            journal.flush()
+        print "Total number of students: " + str(total)
+        elapsed = time.time() - start
+        metrics.timing('generate.duration', elapsed * 1000, course_key)
+        metrics.increment(
+            'generate.students', course_key,
+            tags=[u'outcome:success'], value=processed - failed)
+        metrics.increment(
+            'generate.students', course_key,
+            tags=[u'outcome:error'], value=failed)
+        if (options['delta'] and not failed and not options['resume'] and
+                not options['retry_failed']):
+            # failed students stay in the next delta run, and a resumed or
+            # retry run didn't go through the changes since its own start
+            AccredibleWatermark.set(
+                watermark_name(course_key, shard), run_started)
+        print("Processed {0} of {1} students ({2} failures)"
+              " in {3:.1f}s, {4:.2f} students/s".format(
+                  processed, total, failed, elapsed,
+                  processed / elapsed if elapsed else 0))
+        if skipped:
+            print("{0} students skipped, claimed by another run".format(
+                skipped))
+        if shard is not None:
+            print("Course progress across shards: {0}".format(', '.join(
+                '{0} {1}'.format(count, outcome)
+                for outcome, count in sorted(journal.summary().items()))))
+        return {
+            'course_id': unicode(course_key),
+            'total': total,
+            'processed': processed,
+            'failed': failed,
+            'skipped': skipped,
+            'elapsed': elapsed,
+        }
+
+    def plan_course(self, course_key, course, students, after, run):
+        """
+        --plan: decide the outcome of the students of one course as
+        generate_for_course would, without Accredible calls or database
+        writes. Computing a grade writes it, so only persisted grades are
+        used and students without one are reported as ungraded.
+
+        Writes one JSON object per student to --plan-output (stdout by
+        default) and returns the course summary with the outcome counts
+        and the estimated runtime.
+        """
+        options = run['options']
+        valid_statuses = run['valid_statuses']
+        if options['plan_output']:
+            output = open(options['plan_output'], 'a')
+        else:
+            output = self.plan_stream
+        counts = dict.fromkeys([
+            ISSUE, CertificateStatuses.restricted,
+            CertificateStatuses.notpassing, UNCHANGED, UNGRADED, 'error'], 0)
+        total = 0
+        start = time.time()
+
+        def emit(student, context, grade, outcome):
+            counts[outcome] += 1
+            output.write(json.dumps({
+                'course_id': unicode(course_key),
+                'user_id': student.id,
+                'username': student.username,
+                'email': student.email,
+                'status': context.status,
+                'grade': grade,
+                'outcome': outcome,
+            }) + '\n')
+
+        try:
+            for enrollment_chunk in keyset_chunks(
+                    students, options['chunk_size'], after):
+                chunk_students = [
+                    enrollment.user for enrollment in enrollment_chunk]
+                total += len(chunk_students)
+                eligibility = CourseEligibility(
+                    course_key,
+                    [student.id for student in chunk_students]
+                )
+                contexts = dict(
+                    (student.id, eligibility.for_student(student))
+                    for student in chunk_students
+                )
+                candidates = []
+                for student in chunk_students:
+                    if contexts[student.id].status in valid_statuses:
+                        candidates.append(student)
+                    else:
+                        emit(student, contexts[student.id], None, UNCHANGED)
+                for student, grade, error in iter_course_grades(
+                        candidates, course, compute=False):
+                    context = contexts[student.id]
+                    if error is not None:
+                        emit(student, context, None, 'error')
+                        continue
+                    if grade is None:
+                        emit(student, context, None, UNGRADED)
+                        continue
+                    emit(student, context, grade.percent, certificate_outcome(
+                        grade_points(grade.percent),
+                        context.is_whitelisted,
+                        not context.allow_certificate
+                    ))
+        finally:
+            if output is not self.plan_stream:
+                output.close()
+        elapsed = time.time() - start
+
+        # Reading the grades was measured above, the Accredible calls are
+        # estimated from their latency, the concurrency and the rate limit
+        calls = counts[ISSUE]
+        if options['batch_size'] > 0:
+            calls = (calls + options['batch_size'] - 1) // options['batch_size']
+        concurrency = max(min(
+            options['workers'],
+            getattr(settings, 'ACCREDIBLE_MAX_CONCURRENCY',
+                    DEFAULT_MAX_CONCURRENCY)), 1)
+        api_seconds = max(
+            calls * options['call_latency'] / 1000.0 / concurrency,
+            calls / float(getattr(
+                settings, 'ACCREDIBLE_RATE_LIMIT', DEFAULT_RATE_LIMIT))
+        )
+        if options['workers'] > 1:
+            # grading and issuance overlap
+            estimate = max(elapsed, api_seconds)
+        else:
+            estimate = elapsed + api_seconds
+
+        print("Plan for {0}: {1} students, {2} would get a {3} certificate,"
+              " {4} restricted, {5} notpassing, {6} left unchanged,"
+              " {7} without a persisted grade, {8} could not be"
+              " graded".format(
+                  course_key, total, counts[ISSUE], run['new_status'],
+                  counts[CertificateStatuses.restricted],
+                  counts[CertificateStatuses.notpassing],
+                  counts[UNCHANGED], counts[UNGRADED], counts['error']))
+        print("Estimated runtime {0:.0f}s: reading grades {1:.1f}s (measured),"
+              " {2} Accredible calls at {3:.0f}ms on {4} threads".format(
+                  estimate, elapsed, calls, options['call_latency'],
+                  concurrency))
+        return {
+            'course_id': unicode(course_key),
+            'total': total,
+            'processed': total - counts[UNCHANGED],
+            'failed': counts['error'],
+            'skipped': 0,
+            'elapsed': estimate,
+            'plan': counts,
+        }
+
+    @staticmethod
+    def _flatten_batches(results):
+        for batch, batch_results, exc_info in results:
+            if exc_info is not None:
+                for item in batch:
+                    yield item, None, exc_info
+            else:
+                for result in batch_results:
+                    yield result
@@ -0,0 +1,201 @@
+"""
+Management command raising the grade of the Accredible credentials of a
+course whose learners now have a better grade, e.g. after a grading policy
+fix.
+"""
+import threading
+import time
+import traceback
+
+from django.core.management.base import BaseCommand, CommandError
+from lms.djangoapps.certificates.models import CertificateStatuses, GeneratedCertificate
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey
+from opaque_keys.edx.locations import SlashSeparatedCourseKey
+from xmodule.modulestore.django import modulestore
+
+from accredible_certificate import metrics
+from accredible_certificate.client import get_client, set_bulk_mode
+from accredible_certificate.concurrency import imap
+from accredible_certificate.grades import iter_course_grades
+from accredible_certificate.mirror import sync_course
+from accredible_certificate.models import AccredibleCredential
+from accredible_certificate.queue import CertificateGeneration, grade_points
+
+
+class Command(BaseCommand):
+    help = """
+    Regrade the learners holding a downloadable certificate of a course and
+    raise the grade of their Accredible credential when it went up.
+
+    The credentials of the course are fetched once, through the paginated
+    listing kept in the local mirror, instead of one search per learner.
+    Use --dry-run to only report the credentials that would change.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-c', '--course',
+            metavar='COURSE_ID',
+            dest='course',
+            default=False,
+            help='Course to regenerate the certificates of'),
+        parser.add_argument(
+            '-a', '--api_key',
+            metavar='API_KEY',
+            dest='api_key',
+            default=None,
+            help='API key for accredible Certificate, if don\'t have one'
+            'Visit https://accredible.com/issuer/sign_up and get one'),
+        parser.add_argument(
+            '-w', '--workers',
+            metavar='N',
+            dest='workers',
+            type=int,
+            default=1,
+            help='Send the credential updates on N threads in parallel.'),
+        parser.add_argument(
+            '--persisted-grades',
+            action='store_true',
+            dest='persisted_grades',
+            default=False,
+            help='Use the persisted course grades instead of recomputing'
+            ' them, learners without a persisted grade are still graded.'),
+        parser.add_argument(
+            '--full-sync',
+            action='store_true',
+            dest='full_sync',
+            default=False,
+            help='Re-download every credential of the course instead of'
+            ' the ones changed since the last sync.'),
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            dest='dry_run',
+            default=False,
+            help='Report the credentials whose grade would be raised'
+            ' without updating them.')
+
+    def handle(self, *args, **options):
+        # Throttled calls wait and are retried, no learner waits on a command
+        set_bulk_mode()
+        if options['course']:
+            try:
+                course_key = CourseKey.from_string(options['course'])
+            except InvalidKeyError:
+                course_key = SlashSeparatedCourseKey.from_deprecated_string(
+                    options['course'])
+        else:
+            raise CommandError("You must specify a course")
+
+        if options['api_key']:
+            api_key = options['api_key']
+        else:
+            raise CommandError(
+                "You must give a api_key, if don't have one visit: https://accredible.com/issuer/sign_up")
+
+        # One paginated listing of the course, then credentials by email
+        achievement_id = course_key.to_deprecated_string()
+        with metrics.timed('regenerate.sync', course_key):
+            synced = sync_course(
+                get_client(api_key), achievement_id, full=options['full_sync'])
+        credentials = dict(
+            (email, (credential_id, grade))
+            for email, credential_id, grade in
+            AccredibleCredential.objects.filter(
+                achievement_id=achievement_id
+            ).order_by('credential_id').values_list(
+                'email', 'credential_id', 'grade')
+        )
+        print("{0} credentials synced, {1} in the course".format(
+            synced, len(credentials)))
+
+        certificates = dict(
+            (cert.user_id, cert) for cert in
+            GeneratedCertificate.objects.filter(
+                course_id=course_key,
+                status=CertificateStatuses.downloadable
+            ).select_related('user')
+        )
+        course = modulestore().get_course(course_key, depth=2)
+        graded = iter_course_grades(
+            [cert.user for cert in certificates.values()],
+            course,
+            use_persisted=options['persisted_grades']
+        )
+
+        # raised() runs on the feeder thread of imap_threaded, the results
+        # are counted on this one: each thread has its own counts
+        found = dict.fromkeys(
+            ['graded', 'missing', 'no_grade', 'raised', 'failed'], 0)
+        counts = dict.fromkeys(['updated', 'failed'], 0)
+
+        def raised():
+            for student, grade, error in graded:
+                if error is not None:
+                    found['failed'] += 1
+                    print("Failed to grade {0}: {1}".format(
+                        student.username, error))
+                    continue
+                found['graded'] += 1
+                if student.email not in credentials:
+                    found['missing'] += 1
+                    continue
+                credential_id, current = credentials[student.email]
+                if current is None:
+                    # The mirror doesn't know the grade Accredible has
+                    found['no_grade'] += 1
+                    print("Skipped {0} {1}: credential {2} has no"
+                          " grade".format(
+                              student.username, student.email,
+                              credential_id))
+                    continue
+                if grade_points(grade.percent) > current:
+                    found['raised'] += 1
+                    print("{0} {1}: {2} -> {3}".format(
+                        student.username, student.email, current,
+                        grade_points(grade.percent)))
+                    yield certificates[student.id], credential_id, grade.percent
+
+        start = time.time()
+        if options['dry_run']:
+            for __ in raised():
+                pass
+        else:
+            # CertificateGeneration keeps per-call state on self.request,
+            # so every thread gets its own instance
+            local = threading.local()
+
+            def update(upgrade):
+                xq = getattr(local, 'xq', None)
+                if xq is None:
+                    xq = local.xq = CertificateGeneration(api_key=api_key)
+                return xq.update_grade(*upgrade)
+
+            results = imap(update, raised(), options['workers'])
+            for (cert, __, __), updated, exc_info in results:
+                if exc_info is not None:
+                    counts['failed'] += 1
+                    print("Failed to update {0}:\n{1}".format(
+                        cert.user.username,
+                        ''.join(traceback.format_exception(*exc_info))))
+                elif updated:
+                    counts['updated'] += 1
+                else:
+                    counts['failed'] += 1
+                    print("Accredible refused the update of {0}".format(
+                        cert.user.username))
+        elapsed = time.time() - start
+
+        metrics.timing('regenerate.duration', elapsed * 1000, course_key)
+        metrics.increment(
+            'regenerate.updated', course_key, value=counts['updated'])
+        print("{0} certificates, {1} graded, {2} without a credential,"
+              " {3} without a mirrored grade, {4} grades raised{5},"
+              " {6} failures in {7:.1f}s".format(
+                  len(certificates), found['graded'], found['missing'],
+                  found['no_grade'], found['raised'],
+                  ' (dry run)' if options['dry_run'] else
+                  ' ({0} updated)'.format(counts['updated']),
+                  found['failed'] + counts['failed'], elapsed))
+
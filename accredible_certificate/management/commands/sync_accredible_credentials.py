@@ -0,0 +1,64 @@
+"""
+Management command updating the local mirror of the credentials issued on
+Accredible for a course.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey
+from opaque_keys.edx.locations import SlashSeparatedCourseKey
+
+from accredible_certificate.client import get_client, set_bulk_mode
+from accredible_certificate.mirror import sync_course
+
+
+class Command(BaseCommand):
+    help = """
+    Fetch the credentials of a course changed on Accredible since the last
+    sync and store them in the local credential mirror.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-c', '--course',
+            metavar='COURSE_ID',
+            dest='course',
+            default=False,
+            help='Course to sync the credentials of'),
+        parser.add_argument(
+            '-a', '--api_key',
+            metavar='API_KEY',
+            dest='api_key',
+            default=None,
+            help='API key for accredible Certificate, if don\'t have one'
+            'Visit https://accredible.com/issuer/sign_up and get one')
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            dest='full',
+            default=False,
+            help='Ignore the watermark and re-download every credential')
+
+    def handle(self, *args, **options):
+        # Throttled calls wait and are retried, no learner waits on a command
+        set_bulk_mode()
+        if options['course']:
+            try:
+                course_id = CourseKey.from_string(options['course'])
+            except InvalidKeyError:
+                course_id = SlashSeparatedCourseKey.from_deprecated_string(
+                    options['course'])
+        else:
+            raise CommandError("You must specify a course")
+
+        if options['api_key']:
+            api_key = options['api_key']
+        else:
+            raise CommandError(
+                "You must give a api_key, if don't have one visit: https://accredible.com/issuer/sign_up")
+
+        synced = sync_course(
+            get_client(api_key),
+            course_id.to_deprecated_string(),
+            full=options['full']
+        )
+        print("{0} credentials created or changed".format(synced))
@@ -0,0 +1,145 @@
+"""
+Timing and counter metrics of the certificate issuance phases.
+
+Metrics go to a pluggable sink chosen with ``ACCREDIBLE_METRICS_SINK``, the
+dotted path of a class implementing ``timing``, ``increment`` and
+``gauge``. ``DogStatsSink`` (the default) sends them to statsd through
+dog_stats_api like the rest of the LMS, ``LoggingSink`` writes them to the
+log and ``NullSink`` drops them.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'accredible'
+DEFAULT_SINK = 'accredible_certificate.metrics.DogStatsSink'
+
+
+class NullSink(object):
+    """
+    Sink discarding every metric.
+    """
+
+    def timing(self, name, value, tags=None):
+        pass
+
+    def increment(self, name, value=1, tags=None):
+        pass
+
+    def gauge(self, name, value, tags=None):
+        pass
+
+
+class DogStatsSink(NullSink):
+    """
+    Sink sending metrics to statsd through dog_stats_api.
+    """
+
+    def __init__(self):
+        from dogapi import dog_stats_api
+        self.stats = dog_stats_api
+
+    def timing(self, name, value, tags=None):
+        self.stats.histogram(name, value, tags=tags)
+
+    def increment(self, name, value=1, tags=None):
+        self.stats.increment(name, value, tags=tags)
+
+    def gauge(self, name, value, tags=None):
+        self.stats.gauge(name, value, tags=tags)
+
+
+class LoggingSink(NullSink):
+    """
+    Sink writing metrics to the ``accredible_certificate.metrics`` logger.
+    """
+
+    def timing(self, name, value, tags=None):
+        logger.info(u'timing {} {:.1f}ms {}'.format(name, value, tags or []))
+
+    def increment(self, name, value=1, tags=None):
+        logger.info(u'increment {} {} {}'.format(name, value, tags or []))
+
+    def gauge(self, name, value, tags=None):
+        logger.info(u'gauge {} {} {}'.format(name, value, tags or []))
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    """
+    Return the configured sink, NullSink if it can't be loaded.
+    """
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            path = getattr(settings, 'ACCREDIBLE_METRICS_SINK', DEFAULT_SINK)
+            try:
+                _sink = import_string(path)()
+            except Exception:
+                logger.exception(
+                    u'Unable to load metrics sink {}'.format(path))
+                _sink = NullSink()
+        return _sink
+
+
+def _tags(course_id, tags):
+    tags = list(tags or [])
+    if course_id is not None:
+        tags.append(u'course_id:{}'.format(course_id))
+    return tags
+
+
+def timing(name, value, course_id=None, tags=None):
+    get_sink().timing(METRIC_PREFIX + '.' + name, value, _tags(course_id, tags))
+
+
+def increment(name, course_id=None, tags=None, value=1):
+    get_sink().increment(METRIC_PREFIX + '.' + name, value, _tags(course_id, tags))
+
+
+def gauge(name, value, course_id=None, tags=None):
+    get_sink().gauge(METRIC_PREFIX + '.' + name, value, _tags(course_id, tags))
+
+
+class timed(object):
+    """
+    Context manager timing one phase, in milliseconds.
+
+    Emits ``accredible.<phase>.duration`` and counts
+    ``accredible.<phase>``, both tagged with the course and the outcome.
+    The outcome is ``success`` or ``error`` (an exception escaped) unless
+    the block sets ``outcome`` itself::
+
+        with timed('api.create', course_id) as phase:
+            response = client.create_credential(payload)
+            phase.outcome = response.status_code
+    """
+
+    def __init__(self, phase, course_id=None, tags=None):
+        self.phase = phase
+        self.tags = _tags(course_id, tags)
+        self.outcome = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = (time.time() - self.start) * 1000
+        outcome = self.outcome
+        if outcome is None:
+            outcome = 'error' if exc_type is not None else 'success'
+        tags = self.tags + [u'outcome:{}'.format(outcome)]
+        sink = get_sink()
+        name = METRIC_PREFIX + '.' + self.phase
+        sink.timing(name + '.duration', duration, tags)
+        sink.increment(name, 1, tags)
+        return False
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccredibleCredential',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('credential_id', models.BigIntegerField(unique=True)),
+                ('achievement_id', models.CharField(max_length=255)),
+                ('email', models.CharField(max_length=254)),
+                ('grade', models.FloatField(null=True, blank=True)),
+                ('approved', models.BooleanField(default=False)),
+                ('url', models.CharField(default='', max_length=255, blank=True)),
+                ('updated_at', models.DateTimeField(null=True, blank=True)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AccredibleWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(unique=True, max_length=255)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='accrediblecredential',
+            index_together=set([('email', 'achievement_id')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accredible_certificate', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CertificateRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', models.CharField(max_length=255)),
+                ('status', models.CharField(default='pending', max_length=32, choices=[('pending', 'pending'), ('processing', 'processing'), ('done', 'done'), ('failed', 'failed')])),
+                ('result', models.CharField(default='', max_length=64, blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='certificaterequest',
+            index_together=set([('user', 'course_id')]),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accredible_certificate', '0002_certificaterequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJournalEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', models.CharField(max_length=255)),
+                ('user_id', models.IntegerField()),
+                ('outcome', models.CharField(max_length=16, choices=[('done', 'done'), ('failed', 'failed')])),
+                ('result', models.CharField(default='', max_length=64, blank=True)),
+                ('error', models.TextField(default='', blank=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='generationjournalentry',
+            unique_together=set([('course_id', 'user_id')]),
+        ),
+    ]
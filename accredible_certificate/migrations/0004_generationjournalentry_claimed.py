@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accredible_certificate', '0003_generationjournalentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='generationjournalentry',
+            name='outcome',
+            field=models.CharField(max_length=16, choices=[('claimed', 'claimed'), ('done', 'done'), ('failed', 'failed')]),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accredible_certificate', '0004_generationjournalentry_claimed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', models.CharField(max_length=255)),
+                ('shard', models.CharField(default='', max_length=32, blank=True)),
+                ('enrollment_id', models.IntegerField()),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='generationcheckpoint',
+            unique_together=set([('course_id', 'shard')]),
+        ),
+    ]
@@ -0,0 +1,147 @@
+"""
+Keeps the local ``AccredibleCredential`` mirror in sync with Accredible.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accredible_certificate.models import AccredibleCredential, AccredibleWatermark
+from accredible_certificate.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+SYNC_CHUNK_SIZE = 200
+MIRROR_FIELDS = ('achievement_id', 'email', 'grade', 'approved', 'url', 'updated_at')
+
+
+def watermark_name(achievement_id):
+    return 'credentials:' + achievement_id
+
+
+def _mirror_values(credential, achievement_id=None):
+    """
+    Map a credential from the API to AccredibleCredential field values.
+    """
+    grade = credential.get("grade")
+    try:
+        grade = float(grade) if grade not in (None, '') else None
+    except (TypeError, ValueError):
+        grade = None
+    updated_at = credential.get("updated_at")
+    return {
+        'achievement_id': achievement_id or credential.get("achievement_id") or '',
+        'email': credential["recipient"]["email"],
+        'grade': grade,
+        'approved': bool(credential.get("approve")),
+        'url': credential.get("url") or
+        "https://www.credential.net/" + str(credential["id"]),
+        'updated_at': parse_datetime(updated_at) if updated_at else None,
+    }
+
+
+def store_credentials(credentials, achievement_id=None):
+    """
+    Insert or update the mirror rows of ``credentials`` (API dicts).
+
+    Works in chunks: one query finds the existing rows of a chunk, new rows
+    are bulk inserted and only changed rows are written. Returns the number
+    of rows created or changed.
+    """
+    written = 0
+    for chunk in chunked(credentials, SYNC_CHUNK_SIZE):
+        values = dict(
+            (credential["id"], _mirror_values(credential, achievement_id))
+            for credential in chunk
+        )
+        with transaction.atomic():
+            existing = AccredibleCredential.objects.filter(
+                credential_id__in=values.keys())
+            for row in existing:
+                new = values.pop(row.credential_id)
+                # webhook payloads don't carry the achievement id
+                new['achievement_id'] = new['achievement_id'] or row.achievement_id
+                if any(getattr(row, field) != new[field] for field in MIRROR_FIELDS):
+                    for field in MIRROR_FIELDS:
+                        setattr(row, field, new[field])
+                    row.save()
+                    written += 1
+            AccredibleCredential.objects.bulk_create([
+                AccredibleCredential(credential_id=credential_id, **new)
+                for credential_id, new in values.items()
+            ])
+            written += len(values)
+    return written
+
+
+def store_credential(credential, achievement_id=None, new=False):
+    """
+    Insert or update the mirror row of a single credential.
+
+    A ``new`` credential, just created on Accredible, is inserted with one
+    query; callers must not be in a transaction, the insert falls back to
+    an update when a webhook mirrored the credential first. Otherwise the
+    row is updated, and inserted when it doesn't exist.
+    """
+    values = _mirror_values(credential, achievement_id)
+    if new:
+        try:
+            AccredibleCredential.objects.create(
+                credential_id=credential["id"], **values)
+            return
+        except IntegrityError:
+            pass
+    # update() bypasses auto_now
+    updated = dict(values, synced_at=timezone.now())
+    if not updated['achievement_id']:
+        del updated['achievement_id']
+    if not AccredibleCredential.objects.filter(
+            credential_id=credential["id"]).update(**updated):
+        AccredibleCredential.objects.create(
+            credential_id=credential["id"], **values)
+
+
+def sync_course(client, achievement_id, full=False):
+    """
+    Bring the mirror of ``achievement_id`` up to date.
+
+    Unless ``full`` is set, only credentials changed since the last
+    successful sync are requested. The watermark is the time the sync
+    started, so changes made while it runs are picked up next time.
+    Returns the number of mirror rows created or changed.
+    """
+    name = watermark_name(achievement_id)
+    since = None if full else AccredibleWatermark.get(name)
+    started = timezone.now()
+    params = {}
+    if since is not None:
+        params['updated_since'] = since.isoformat()
+    written = store_credentials(
+        client.iter_credentials(achievement_id, **params),
+        achievement_id
+    )
+    AccredibleWatermark.set(name, started)
+    logger.info('Synced {} credentials of {} since {}'.format(
+        written, achievement_id, since))
+    return written
+
+
+def find_credential(email, achievement_id):
+    """
+    Return the mirrored credential of a learner in a course, or None.
+    """
+    return AccredibleCredential.objects.filter(
+        email=email,
+        achievement_id=achievement_id
+    ).order_by('-credential_id').first()
+
+
+def approved_emails(achievement_id):
+    """
+    Return the set of recipient emails with an approved credential.
+    """
+    return set(AccredibleCredential.objects.filter(
+        achievement_id=achievement_id,
+        approved=True
+    ).values_list('email', flat=True))
@@ -0,0 +1,160 @@
+"""
+Local state kept by the Accredible integration.
+"""
+from django.contrib.auth.models import User
+from django.db import models
+
+
+class AccredibleCredential(models.Model):
+    """
+    Local mirror of a credential issued on Accredible.
+
+    Kept current by add_cert and the sync_accredible_credentials command,
+    so lookups by (email, achievement_id) don't need an API call.
+    """
+    credential_id = models.BigIntegerField(unique=True)
+    achievement_id = models.CharField(max_length=255)
+    email = models.CharField(max_length=254)
+    grade = models.FloatField(null=True, blank=True)
+    approved = models.BooleanField(default=False)
+    url = models.CharField(max_length=255, blank=True, default='')
+    updated_at = models.DateTimeField(null=True, blank=True)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta(object):
+        app_label = 'accredible_certificate'
+        index_together = (('email', 'achievement_id'),)
+
+    def __unicode__(self):
+        return u'{} ({}, {})'.format(
+            self.credential_id, self.email, self.achievement_id)
+
+
+class AccredibleWatermark(models.Model):
+    """
+    Point in time up to which an incremental job has processed its data.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    value = models.DateTimeField()
+
+    class Meta(object):
+        app_label = 'accredible_certificate'
+
+    def __unicode__(self):
+        return u'{}: {}'.format(self.name, self.value)
+
+    @classmethod
+    def get(cls, name):
+        """
+        Return the watermark ``name`` or None if it was never set.
+        """
+        try:
+            return cls.objects.get(name=name).value
+        except cls.DoesNotExist:
+            return None
+
+    @classmethod
+    def set(cls, name, value):
+        cls.objects.update_or_create(name=name, defaults={'value': value})
+
+
+class CertificateRequest(models.Model):
+    """
+    A request_certificate call processed in the background.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, PENDING),
+        (PROCESSING, PROCESSING),
+        (DONE, DONE),
+        (FAILED, FAILED),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=32, choices=STATUS_CHOICES, default=PENDING)
+    # add_status returned by the synchronous request_certificate
+    result = models.CharField(max_length=64, blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta(object):
+        app_label = 'accredible_certificate'
+        index_together = (('user', 'course_id'),)
+
+    def __unicode__(self):
+        return u'{} {} ({})'.format(self.user_id, self.course_id, self.status)
+
+    @property
+    def is_active(self):
+        return self.status in (self.PENDING, self.PROCESSING)
+
+
+class GenerationJournalEntry(models.Model):
+    """
+    Outcome of one learner in the latest generate_accredible_certs run of a
+    course, used to resume interrupted runs and retry failures.
+    """
+    CLAIMED = 'claimed'
+    DONE = 'done'
+    FAILED = 'failed'
+    OUTCOME_CHOICES = (
+        (CLAIMED, CLAIMED),
+        (DONE, DONE),
+        (FAILED, FAILED),
+    )
+
+    course_id = models.CharField(max_length=255)
+    user_id = models.IntegerField()
+    outcome = models.CharField(max_length=16, choices=OUTCOME_CHOICES)
+    # status returned by add_cert
+    result = models.CharField(max_length=64, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta(object):
+        app_label = 'accredible_certificate'
+        unique_together = (('course_id', 'user_id'),)
+
+    def __unicode__(self):
+        return u'{} {} ({})'.format(self.course_id, self.user_id, self.outcome)
+
+
+class GenerationCheckpoint(models.Model):
+    """
+    Last enrollment of the last chunk a generate_accredible_certs run of a
+    course (or of one of its shards) finished, where --resume starts again.
+    """
+    course_id = models.CharField(max_length=255)
+    # "K/N" for sharded runs, empty otherwise
+    shard = models.CharField(max_length=32, blank=True, default='')
+    enrollment_id = models.IntegerField()
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta(object):
+        app_label = 'accredible_certificate'
+        unique_together = (('course_id', 'shard'),)
+
+    def __unicode__(self):
+        return u'{} {} {}'.format(self.course_id, self.shard, self.enrollment_id)
+
+
+class WebhookEvent(models.Model):
+    """
+    Credential received from an Accredible webhook, stored before the
+    webhook is answered and deleted once applied, see webhooks.py.
+    """
+    credential_id = models.BigIntegerField()
+    # the credential of the event, JSON encoded
+    credential = models.TextField()
+    received = models.DateTimeField(auto_now_add=True)
+
+    class Meta(object):
+        app_label = 'accredible_certificate'
+
+    def __unicode__(self):
+        return u'{} {}'.format(self.credential_id, self.received)
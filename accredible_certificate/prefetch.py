@@ -0,0 +1,114 @@
+"""
+Set-based loading of the per-learner data add_cert needs in bulk runs.
+
+Instead of several queries per learner, ``CourseEligibility`` loads the
+certificate rows, profiles, whitelist, restriction flags and enrollment modes
+of a whole course (or of one chunk of its learners) in a constant number of
+queries, and hands ``add_cert`` a ``StudentContext`` per learner.
+``student_context`` builds the same context for a single learner, for the
+request_certificate path.
+"""
+from collections import namedtuple
+
+from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef, Subquery
+from lms.djangoapps.certificates.models import CertificateStatuses as status
+from lms.djangoapps.certificates.models import CertificateWhitelist
+from lms.djangoapps.certificates.models import GeneratedCertificate
+from student.models import CourseEnrollment, UserProfile
+
+
+StudentContext = namedtuple('StudentContext', [
+    'status',             # current certificate status, as certificate_status_for_student
+    'certificate',        # existing GeneratedCertificate or None
+    'name',               # UserProfile.name, None when the user has no profile
+    'allow_certificate',  # UserProfile.allow_certificate
+    'is_whitelisted',
+    'enrollment_mode',
+])
+
+
+class CourseEligibility(object):
+    """
+    Preloaded eligibility data for the learners of a course.
+
+    Arguments:
+      course_key - CourseKey
+      user_ids   - optional iterable restricting the load to these users
+    """
+
+    def __init__(self, course_key, user_ids=None):
+        self.course_key = course_key
+        if user_ids is not None:
+            user_ids = list(user_ids)
+
+        def scoped(queryset, field='user_id'):
+            if user_ids is None:
+                return queryset
+            return queryset.filter(**{field + '__in': user_ids})
+
+        self.certificates = dict(
+            (cert.user_id, cert) for cert in scoped(
+                GeneratedCertificate.objects.filter(course_id=course_key))
+        )
+        self.enrollment_modes = dict(scoped(
+            CourseEnrollment.objects.filter(course_id=course_key)
+        ).values_list('user_id', 'mode'))
+        self.whitelisted = set(scoped(
+            CertificateWhitelist.objects.filter(
+                course_id=course_key, whitelist=True)
+        ).values_list('user_id', flat=True))
+        self.profiles = dict(
+            (user_id, (name, allow_certificate))
+            for user_id, name, allow_certificate in scoped(
+                UserProfile.objects.filter(
+                    user__courseenrollment__course_id=course_key)
+            ).values_list('user_id', 'name', 'allow_certificate')
+        )
+
+    def for_student(self, student):
+        """
+        Return the ``StudentContext`` of ``student``.
+        """
+        cert = self.certificates.get(student.id)
+        name, allow_certificate = self.profiles.get(student.id, (None, True))
+        return StudentContext(
+            status=cert.status if cert is not None else status.unavailable,
+            certificate=cert,
+            name=name,
+            allow_certificate=allow_certificate,
+            is_whitelisted=student.id in self.whitelisted,
+            enrollment_mode=self.enrollment_modes.get(student.id),
+        )
+
+
+def student_context(student, course_key, certificate):
+    """
+    Return the ``StudentContext`` of one learner whose certificate row (or
+    None) was already loaded, in one query.
+    """
+    profile = UserProfile.objects.filter(user_id=OuterRef('pk'))
+    name, allow_certificate, is_whitelisted, enrollment_mode = User.objects.filter(
+        id=student.id
+    ).annotate(
+        profile_name=Subquery(profile.values('name')[:1]),
+        profile_allow_certificate=Subquery(
+            profile.values('allow_certificate')[:1]),
+        is_whitelisted=Exists(CertificateWhitelist.objects.filter(
+            user_id=OuterRef('pk'), course_id=course_key, whitelist=True)),
+        enrollment_mode=Subquery(CourseEnrollment.objects.filter(
+            user_id=OuterRef('pk'), course_id=course_key
+        ).values('mode')[:1]),
+    ).values_list(
+        'profile_name', 'profile_allow_certificate', 'is_whitelisted',
+        'enrollment_mode'
+    ).get()
+    return StudentContext(
+        status=certificate.status if certificate is not None else status.unavailable,
+        certificate=certificate,
+        name=name,
+        # No profile, as CourseEligibility
+        allow_certificate=True if allow_certificate is None else bool(allow_certificate),
+        is_whitelisted=bool(is_whitelisted),
+        enrollment_mode=enrollment_mode,
+    )
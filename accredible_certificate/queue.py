@@ -16,6 +16,7 @@ from lms.djangoapps.verify_student.models import (
 )
 import json
 import random
+from collections import namedtuple
 import logging
 import lxml.html
 from lxml.etree import XMLSyntaxError, ParserError
@@ -23,9 +24,67 @@ import requests
 from xmodule.modulestore.django import modulestore
 from util.db import outer_atomic
 from django.db import transaction
+from django.utils import timezone
+
+from accredible_certificate.breaker import CircuitOpenError
+from accredible_certificate.client import ThrottledError, get_client
+from accredible_certificate.course_context import get_course_context
+from accredible_certificate.mirror import find_credential, store_credential
+from accredible_certificate.models import AccredibleCredential
+from accredible_certificate.prefetch import student_context
+from accredible_certificate import status_cache
+from accredible_certificate.metrics import timed
 
 logger = logging.getLogger(__name__)
 
+# Outcome of CertificateGeneration.prepare_cert, payload is None when no
+# credential has to be created
+PendingCertificate = namedtuple(
+    'PendingCertificate', ['status', 'cert', 'payload', 'achievement_id'])
+
+# Returned by request_certificate while the Accredible circuit breaker is
+# open or Accredible throttles the calls, the learner should try again later
+DEFERRED = 'deferred'
+
+# Outcome of certificate_outcome when a credential is to be created
+ISSUE = 'issue'
+
+
+def deferrable_failure(error=None, response=None):
+    """
+    Whether a failed Accredible call was refused by the circuit breaker or
+    throttled, rather than rejected by Accredible.
+    """
+    if isinstance(error, (CircuitOpenError, ThrottledError)):
+        return True
+    if response is None and isinstance(error, requests.HTTPError):
+        response = error.response
+    return response is not None and response.status_code == 429
+
+
+def grade_points(percent):
+    """
+    Grade sent to Accredible for a percent between 0 and 1, in whole points
+    (0-100). Grades are compared on this scale, so float noise never
+    counts as a change.
+    """
+    return int(round(percent * 100))
+
+
+def certificate_outcome(grade_contents, is_whitelisted, is_restricted):
+    """
+    Decide what prepare_cert does with a graded student: ISSUE a
+    credential, or set status.restricted or status.notpassing.
+
+    ``grade_contents`` is the grade in points (0-100). Also used by the
+    --plan mode of generate_accredible_certs, which must not drift from it.
+    """
+    if is_whitelisted or grade_contents is not None:
+        if is_restricted:
+            return status.restricted
+        return ISSUE
+    return status.notpassing
+
 
 class CertificateGeneration(object):
     """
@@ -54,7 +113,7 @@ class CertificateGeneration(object):
 
     """
 
-    def __init__(self, request=None, api_key=None):
+    def __init__(self, request=None, api_key=None, writer=None):
 
         # Get basic auth (username/password) for
         # xqueue connection if it's in the settings
@@ -67,6 +126,10 @@ class CertificateGeneration(object):
         self.whitelist = CertificateWhitelist.objects.all()
         self.restricted = UserProfile.objects.filter(allow_certificate=False)
         self.api_key = api_key
+        self.client = get_client(api_key) if api_key else None
+        # writer.CertificateWriter buffering the certificate writes of
+        # bulk runs, certificates are saved one by one without it
+        self.writer = writer
 
     @transaction.non_atomic_requests
     def add_cert(
@@ -77,7 +140,10 @@ class CertificateGeneration(object):
             course=None,
             forced_grade=None,
             template_file=None,
-            title='None'):
+            title='None',
+            context=None,
+            course_grade=None,
+            deferrable=False):
         """
         Request a new certificate for a student.
 
@@ -87,6 +153,14 @@ class CertificateGeneration(object):
           forced_grade - a string indicating a grade parameter to pass with
                          the certificate request. If this is given, grading
                          will be skipped.
+          context   - optional prefetch.StudentContext preloaded by a bulk
+                      run, saves the per-student status, profile,
+                      whitelist, restriction and enrollment queries.
+          course_grade - the student's CourseGrade when it was already
+                         computed in batch, grading will be skipped.
+          deferrable - return DEFERRED instead of calling Accredible while
+                       its circuit breaker is open, or when it throttles
+                       the call.
 
         Will change the certificate status to 'generating' or 'downloadable'.
 
@@ -105,6 +179,44 @@ class CertificateGeneration(object):
         Returns the student's status
         """
 
+        with timed('add_cert', course_id) as phase:
+            pending = self.prepare_cert(
+                student,
+                course_id,
+                defined_status,
+                course=course,
+                forced_grade=forced_grade,
+                context=context,
+                course_grade=course_grade
+            )
+            if pending.payload is None:
+                phase.outcome = pending.status
+                return pending.status
+            if deferrable and self.client.breaker.is_open():
+                phase.outcome = DEFERRED
+                return DEFERRED
+            new_status = self.create_cert(
+                pending, defined_status, deferrable=deferrable)
+            phase.outcome = new_status
+            return new_status
+
+    def prepare_cert(
+            self,
+            student,
+            course_id,
+            defined_status="downloadable",
+            course=None,
+            forced_grade=None,
+            context=None,
+            course_grade=None):
+        """
+        First half of add_cert: grade the student and decide the outcome.
+
+        Restricted and not passing students are saved right away. Returns
+        a PendingCertificate whose payload is the credential to create on
+        Accredible, or None when there is nothing to create.
+        """
+
         VALID_STATUSES = [
             status.generating,
             status.unavailable,
@@ -113,9 +225,13 @@ class CertificateGeneration(object):
             status.notpassing
         ]
 
-        cert_status = certificate_status_for_student(
-            student,
-            course_id)['status']
+        if context is not None:
+            cert_status = context.status
+        else:
+            with timed('db.status', course_id):
+                cert_status = certificate_status_for_student(
+                    student,
+                    course_id)['status']
 
         new_status = cert_status
 
@@ -129,36 +245,35 @@ class CertificateGeneration(object):
             if course is None:
                 course = courses.get_course_by_id(course_id)
 
-            profile = UserProfile.objects.get(user=student)
-            profile_name = profile.name
+            if context is not None and context.name is not None:
+                profile_name = context.name
+            else:
+                profile = UserProfile.objects.get(user=student)
+                profile_name = profile.name
             # Needed
             self.request.user = student
             self.request.session = {}
-            course_name = course.display_name or course_id.to_deprecated_string()
-            description = ''
-            for section_key in ['short_description', 'description', 'overview']:
-                loc = loc = course.location.replace(
-                    category='about',
-                    name=section_key
+            with timed('course_context', course_id):
+                course_context = get_course_context(course_id, course)
+            if context is not None:
+                is_whitelisted = context.is_whitelisted
+            else:
+                is_whitelisted = self.whitelist.filter(
+                    user=student,
+                    course_id=course_id,
+                    whitelist=True).exists()
+
+            if course_grade is not None:
+                grade = course_grade
+            else:
+                with timed('grading', course_id):
+                    grade = CourseGradeFactory().read(student, course)
+            if context is not None:
+                enrollment_mode = context.enrollment_mode
+            else:
+                enrollment_mode, __ = CourseEnrollment.enrollment_mode_for_user(
+                    student, course_id
                 )
-                try:
-                    if modulestore().get_item(loc).data:
-                        description = modulestore().get_item(loc).data
-                        break
-                except:
-                    print("this course don't have " + str(section_key))
-
-            if not description:
-                description = "course_description"
-            is_whitelisted = self.whitelist.filter(
-                user=student,
-                course_id=course_id,
-                whitelist=True).exists()
-
-            grade = CourseGradeFactory().read(student, course)
-            enrollment_mode, __ = CourseEnrollment.enrollment_mode_for_user(
-                student, course_id
-            )
             mode_is_verified = (
                 enrollment_mode == GeneratedCertificate.MODES.verified
             )
@@ -166,10 +281,16 @@ class CertificateGeneration(object):
             if forced_grade:
                 grade = forced_grade
 
-            cert, __ = GeneratedCertificate.objects.get_or_create(
-                user=student,
-                course_id=course_id
-            )
+            if context is not None:
+                cert = context.certificate or GeneratedCertificate(
+                    user=student,
+                    course_id=course_id
+                )
+            else:
+                cert, __ = GeneratedCertificate.objects.get_or_create(
+                    user=student,
+                    course_id=course_id
+                )
 
             cert.mode = cert_mode
             cert.user = student
@@ -179,144 +300,420 @@ class CertificateGeneration(object):
 
             # Strip HTML from grade range label
             # convert percent to points as an integer
-            grade_contents = int(grade.percent * 100)
-
-            if is_whitelisted or grade_contents is not None:
-
-                # check to see whether the student is on the
-                # the embargoed country restricted list
-                # otherwise, put a new certificate request
-                # on the queue
-                print grade_contents
-                if self.restricted.filter(user=student).exists():
-                    new_status = status.restricted
-                    cert.status = new_status
-                    cert.save()
+            grade_contents = grade_points(grade.percent)
+
+            # check to see whether the student is on the
+            # the embargoed country restricted list
+            # otherwise, put a new certificate request
+            # on the queue
+            print grade_contents
+            if context is not None:
+                is_restricted = not context.allow_certificate
+            else:
+                is_restricted = self.restricted.filter(user=student).exists()
+            outcome = certificate_outcome(
+                grade_contents, is_whitelisted, is_restricted)
+            if outcome == status.restricted:
+                new_status = status.restricted
+                cert.status = new_status
+                self.save_cert(cert)
+            elif outcome == ISSUE:
+                if defined_status == "generating":
+                    approve = False
                 else:
-                    contents = {
-                        'action': 'create',
-                        'username': student.username,
-                        'course_id': course_id.to_deprecated_string(),
-                        'course_name': course_name,
-                        'name': profile_name,
-                        'grade': grade_contents
-                    }
-
-                    if defined_status == "generating":
-                        approve = False
-                    else:
-                        approve = True
-
-                    # check to see if this is a BETA course
-                    course_name = course_name.strip()
-                    if course_name.startswith("BETA") or course_name.startswith("Beta") or course_name.startswith("beta"):
-                        course_name = course_name[4:].strip()
-                    grade_into_string = grade.letter_grade
-                    payload = {
-                        "credential":
-                        {
-                            "name": course_name,
-                            "group_name": course_name,
-                            "description": description,
-                            "achievement_id": contents['course_id'],
-                            "course_link": "/courses/" + contents['course_id'] + "/about",
-                            "approve": approve,
-                            "template_name": contents['course_id'],
-                            "grade": contents['grade'],
-                            "recipient": {
-                                "name": contents['name'],
-                                "email": student.email
-                            }
-                        }
-                    }
-
-                    payload = json.dumps(payload)
-
-                    r = requests.post('https://api.accredible.com/v1/credentials', payload, headers={
-                                      'Authorization': 'Token token=' + self.api_key, 'Content-Type': 'application/json'})
-                    if r.status_code == 200:
-                        json_response = r.json()
-                        cert.status = defined_status
-                        cert.key = json_response["credential"]["id"]
-                        if 'private' in json_response:
-                            cert.download_url = "https://www.credential.net/" + \
-                                str(json_response["credential"]["id"]) + \
-                                "?key" + str(json_response["private_key"])
-                        else:
-                            cert.download_url = "https://www.credential.net/" + \
-                                str(cert.key)
-                        cert.save()
-                    else:
-                        new_status = "errors"
+                    approve = True
+
+                payload = course_context.credential_payload(
+                    profile_name,
+                    student.email,
+                    grade_contents,
+                    approve
+                )
+
+                return PendingCertificate(
+                    new_status,
+                    cert,
+                    payload,
+                    course_context.course_id_string
+                )
             else:
                 cert_status = status.notpassing
                 cert.status = cert_status
-                cert.save()
+                self.save_cert(cert)
 
-        return new_status
+        return PendingCertificate(new_status, None, None, None)
+
+    def create_cert(self, pending, defined_status="downloadable",
+                    deferrable=False):
+        """
+        Create the credential of a PendingCertificate on Accredible and save
+        the certificate. Returns the student's status, "errors" when the
+        credential couldn't be created, or with ``deferrable`` DEFERRED when
+        the call was throttled or refused by the circuit breaker.
+        """
+        try:
+            with timed('api.create', pending.cert.course_id) as phase:
+                r = self.client.create_credential(pending.payload)
+                phase.outcome = r.status_code
+        except requests.RequestException as e:
+            if deferrable and deferrable_failure(e):
+                return DEFERRED
+            logger.error(
+                'Accredible credential creation failed for user {} in course {}: {}'.format(
+                    pending.cert.user_id, pending.cert.course_id, e))
+            r = None
+        if r is not None and r.status_code == 200:
+            return self.complete_cert(
+                pending, r.json(), defined_status, new=True)
+        if deferrable and deferrable_failure(response=r):
+            return DEFERRED
+        return "errors"
+
+    def create_certs(self, pendings, defined_status="downloadable"):
+        """
+        Create the credentials of several PendingCertificates with one bulk
+        call. Results are matched back to certificates by recipient email.
+
+        Only the credentials the bulk call reported as failed, or all of
+        them when Accredible refused the call (4xx), are retried one by
+        one. When the response is lost or is a 5xx, some credentials may
+        have been created anyway: each one is looked up on Accredible
+        instead of being posted again, and the ones not found are reported
+        as "errors" for --retry-failed.
+
+        Returns the students' statuses, in the order of ``pendings``.
+        """
+        course_id = pendings[0].cert.course_id
+        try:
+            with timed('api.bulk_create', course_id,
+                       tags=[u'size:{}'.format(len(pendings))]) as phase:
+                r = self.client.bulk_create_credentials(
+                    [pending.payload for pending in pendings])
+                phase.outcome = r.status_code
+        except requests.RequestException as e:
+            logger.error(
+                'Accredible bulk credential creation failed: {}'.format(e))
+            r = None
+        created = {}
+        failed = set()
+        if r is not None and r.status_code == 200:
+            results = r.json().get("results") or []
+            for index, item in enumerate(results):
+                credential = item.get("credential")
+                if credential:
+                    created[credential["recipient"]["email"]] = item
+                elif len(results) == len(pendings):
+                    # Results follow the order of the request
+                    failed.add(index)
+        elif r is not None and r.status_code < 500:
+            failed.update(range(len(pendings)))
+
+        # The certificates of the created credentials are saved together,
+        # in one transaction, right after the call
+        statuses = {}
+        with transaction.atomic():
+            for index, pending in enumerate(pendings):
+                email = pending.payload["credential"]["recipient"]["email"]
+                if email in created:
+                    statuses[index] = self.complete_cert(
+                        pending, created[email], defined_status)
+        for index, pending in enumerate(pendings):
+            if index in statuses:
+                continue
+            if index in failed:
+                statuses[index] = self.create_cert(pending, defined_status)
+            else:
+                statuses[index] = self.reconcile_cert(pending, defined_status)
+        return [statuses[index] for index in range(len(pendings))]
+
+    def reconcile_cert(self, pending, defined_status="downloadable"):
+        """
+        Save the certificate of a PendingCertificate whose credential may
+        have been created by a call whose response was lost. Returns the
+        student's status, "errors" when the credential isn't on Accredible.
+        """
+        email = pending.payload["credential"]["recipient"]["email"]
+        try:
+            credential = self.lookup_credential(
+                pending.achievement_id, email, pending.cert.course_id)
+        except Exception as e:
+            logger.error(
+                'Accredible credential lookup failed for user {} in course {}: {}'.format(
+                    pending.cert.user_id, pending.cert.course_id, e))
+            return "errors"
+        if credential is None:
+            return "errors"
+        return self.complete_cert(
+            pending, {"credential": credential}, defined_status)
+
+    def lookup_credential(self, achievement_id, email, course_id=None):
+        """
+        Find the credential of ``email`` for ``achievement_id`` on
+        Accredible and store it in the mirror. Returns None when there is
+        none, errors of the call are raised.
+        """
+        with timed('api.lookup', course_id) as phase:
+            response = self.client.list_credentials(
+                achievement_id, email=email)
+            phase.outcome = response.status_code
+        response.raise_for_status()
+        for credential in response.json()["credentials"]:
+            if credential["recipient"]["email"] == email:
+                store_credential(credential, achievement_id)
+                return credential
+        return None
+
+    def complete_cert(self, pending, json_response, defined_status="downloadable",
+                      new=False):
+        """
+        Second half of add_cert: save the certificate of a credential
+        created on Accredible. ``json_response`` is the body returned by
+        the create call, ``new`` when it was created just now outside a
+        transaction (see mirror.store_credential).
+
+        Returns the student's status, as add_cert does.
+        """
+        cert = pending.cert
+        cert.status = defined_status
+        cert.key = json_response["credential"]["id"]
+        if 'private' in json_response:
+            cert.download_url = "https://www.credential.net/" + \
+                str(json_response["credential"]["id"]) + \
+                "?key" + str(json_response["private_key"])
+        else:
+            cert.download_url = "https://www.credential.net/" + \
+                str(cert.key)
+        self.save_cert(
+            cert, json_response["credential"], pending.achievement_id, new)
+        return pending.status
+
+    def save_cert(self, cert, credential=None, achievement_id=None, new=False):
+        """
+        Save ``cert``, and store the ``credential`` created for it in the
+        mirror.
+
+        Restricted and notpassing certificates (no ``credential``) are
+        handed to the writer of a bulk run instead. A certificate whose
+        credential was just created is always saved right away, a lost
+        record would make the next run create the credential again.
+        """
+        if self.writer is not None and credential is None:
+            self.writer.add(cert)
+            return
+        cert.save()
+        status_cache.invalidate(cert.user_id, cert.course_id)
+        if credential is not None:
+            store_credential(credential, achievement_id, new)
 
     @transaction.non_atomic_requests
-    def regen_cert(self, student, course_id, course_key, course=None):
+    def regen_cert(self, student, course_id, course_key, course=None,
+                   course_grade=None, certificate=None):
         """
         Regenrate a certificate for a user if the grade is better than
         the current one
+
+        course_grade - the student's CourseGrade when it was already
+                       computed in batch, grading will be skipped.
+        certificate  - the student's GeneratedCertificate when the caller
+                       already loaded it, saves looking it up again.
+
+        Returns True when the grade was raised, False when there was
+        nothing to raise, "errors" when Accredible refused the update,
+        DEFERRED while its circuit breaker is open or it throttles the calls
+        and None when the certificate or credential couldn't be found.
         """
+        with timed('regen_cert', course_id) as phase:
+            regenerated = self._regen_cert(
+                student, course_id, course_key, course, course_grade,
+                certificate)
+            phase.outcome = regenerated
+            return regenerated
+
+    def _regen_cert(self, student, course_id, course_key, course,
+                    course_grade, certificate=None):
         # 1. Check if the user already has a certificate for the course
+        if certificate is None:
+            try:
+                certificate = GeneratedCertificate.objects.get(
+                    user=student,
+                    course_id=course_id
+                )
+            except GeneratedCertificate.DoesNotExist:
+                return None
+        # 2. Get the new grade and compare it with the one stored when the
+        # certificate was issued or last regenerated, no remote call is
+        # needed unless it went up
+        if course_grade is not None:
+            new_grade = course_grade
+        else:
+            with timed('grading', course_id):
+                new_grade = CourseGradeFactory().read(student, course)
         try:
-            generated_certificate = GeneratedCertificate.objects.get(
-                user=student,
-                course_id=course_id
-            )
-        except GeneratedCertificate.DoesNotExist:
-            generated_certificate = None
-            return generated_certificate
-        # 2. Find the issued certificate
-        try:
-            headers = {
-                'Authorization': 'Token token=' + self.api_key,
-                'Content-Type': 'application/json'
-            }
-            values = {
-                "recipient": {
-                "email": student.email
-                }
+            local_grade = float(certificate.grade)
+        except (TypeError, ValueError):
+            local_grade = None
+        if local_grade is not None and (
+                grade_points(new_grade.percent) <= grade_points(local_grade)):
+            return False
+        # 3. Find the issued certificate, in the local mirror first, then
+        # by achievement id
+        achievement_id = course_id.to_deprecated_string()
+        existing_certificate = None
+        with timed('mirror.lookup', course_id):
+            mirrored = find_credential(student.email, achievement_id)
+        if mirrored is not None and mirrored.grade is not None:
+            existing_certificate = {
+                "id": mirrored.credential_id,
+                "grade": mirrored.grade
             }
-            values = json.dumps(values)
-            cert_response = requests.post(
-                'https://api.accredible.com/v1/credentials/search',
-                headers=headers,
-                data=values
-                )
-            for credential in cert_response.json()["credentials"]:
-                if course_key in credential["course_link"]:
-                    existing_certificate = credential
-                    break
-        except Exception as e:
+        else:
+            if self.client.breaker.is_open():
+                return DEFERRED
+            try:
+                existing_certificate = self.lookup_credential(
+                    achievement_id, student.email, course_id)
+            except Exception as e:
+                if deferrable_failure(e):
+                    return DEFERRED
+                return None
+        if existing_certificate is None:
             return None
-        # 2. Find the current grade and get the new grade
-        new_grade = CourseGradeFactory().read(student, course)
-        if existing_certificate:
-            current_grade = float(existing_certificate["grade"])
-        # 3. if new grade > current grade, regenrate the certificate 
-        if new_grade.percent * 100 > current_grade:
+        current_grade = float(existing_certificate["grade"])
+        # 4. if new grade > current grade, regenrate the certificate
+        if grade_points(new_grade.percent) > current_grade:
             # Regenerate the certificate
-            values = {
-                    "credential": {
-                        "approve": True,
-                        "grade": new_grade.percent * 100,
-                    }
+            if self.client.breaker.is_open():
+                return DEFERRED
+            updated = self.update_grade(
+                certificate, existing_certificate["id"], new_grade.percent,
+                deferrable=True)
+            if updated == DEFERRED:
+                return DEFERRED
+            if not updated:
+                # Accredible still has the old grade, the next call retries
+                return "errors"
+            return True
+        # Accredible already has this grade, keep the next checks local
+        self.store_grade(certificate, current_grade / 100)
+        return False
+
+    def update_grade(self, certificate, credential_id, grade,
+                     deferrable=False):
+        """
+        Raise the grade of an issued credential to ``grade`` (a percent
+        between 0 and 1) and record it in the mirror and on the
+        certificate. Returns whether Accredible accepted the update, or with
+        ``deferrable`` DEFERRED when the call was throttled or refused by
+        the circuit breaker.
+        """
+        values = {
+                "credential": {
+                    "approve": True,
+                    "grade": grade_points(grade),
                 }
-            headers = {
-                'Authorization': 'Token token=' + self.api_key,
-                'Content-Type': 'application/json'
             }
-            payload = json.dumps(values)
-            update_response = requests.put(
-                'https://api.accredible.com/v1/credentials/' + str(existing_certificate["id"]),
-                headers=headers,
-                data=payload
-            )
-            if update_response.status_code == 200:
-                return True
-            else:
-                return False
+        try:
+            with timed('api.update', certificate.course_id) as phase:
+                update_response = self.client.update_credential(
+                    credential_id,
+                    values
+                )
+                phase.outcome = update_response.status_code
+        except requests.RequestException as e:
+            if deferrable and deferrable_failure(e):
+                return DEFERRED
+            return False
+        if update_response.status_code != 200:
+            if deferrable and deferrable_failure(response=update_response):
+                return DEFERRED
+            return False
+        AccredibleCredential.objects.filter(
+            credential_id=credential_id
+        ).update(grade=grade_points(grade), approved=True)
+        self.store_grade(certificate, grade)
+        status_cache.invalidate(certificate.user_id, certificate.course_id)
+        return True
+
+    def store_grade(self, certificate, grade):
+        GeneratedCertificate.objects.filter(id=certificate.id).update(
+            grade=grade,
+            # update() bypasses auto_now
+            modified_date=timezone.now()
+        )
+        certificate.grade = grade
+
+
+def request_certificate_for(student, course_key, api_key):
+    """
+    Grade ``student`` and issue or upgrade their certificate for the course.
+
+    This is the work done by the request_certificate view, either in the
+    request or on a background worker. Returns the add_status reported to
+    the client.
+    """
+    with timed('request', course_key) as phase:
+        cert_status = _request_certificate_for(student, course_key, api_key)
+        phase.outcome = cert_status
+        return cert_status
+
+
+def cached_certificate_status(student, course_key):
+    """
+    Return the add_status request_certificate_for would report, from the
+    status cache, or None when it has to do the work.
+    """
+    cached = status_cache.get(student.id, course_key)
+    if cached is not None:
+        if cached['status'] != status.downloadable:
+            return cached['status']
+        if cached['regen_checked'] is not None:
+            # regen_cert checked the grade within the TTL, it would find
+            # nothing to regenerate
+            return False
+    return None
+
+
+def _request_certificate_for(student, course_key, api_key):
+    # While Accredible is down or throttles the calls, add_cert and
+    # regen_cert answer DEFERRED instead of the calls that would fail or
+    # wait, cached and local outcomes are still answered
+    cached = cached_certificate_status(student, course_key)
+    if cached is not None:
+        return cached
+
+    # The certificate row is loaded (or created, as add_cert would) once
+    # and drives both branches: its status replaces
+    # certificate_status_for_student, and it is handed to add_cert (through
+    # a StudentContext) and to regen_cert.
+    xqci = CertificateGeneration(api_key=api_key)
+    course = courses.get_course(course_key)
+
+    cert, __ = GeneratedCertificate.objects.get_or_create(
+        user=student, course_id=course_key)
+    cert_status = cert.status
+    if cert_status in [status.unavailable, status.notpassing, status.error]:
+        logger.info(
+            'Grading and certification requested for user {} in course {} via /request_certificate call'.format(student.username, course_key))
+        # A certificate issued just now carries the current grade, there
+        # is nothing to regenerate
+        return xqci.add_cert(
+            student,
+            course_key,
+            course=course,
+            context=student_context(student, course_key, cert),
+            deferrable=True
+        )
+    # Check if the user already have certificate for this course
+    if cert_status == "downloadable":
+        # If the user has better grade than the one he has already got, generate new certificate
+        regenerated = xqci.regen_cert(
+            student, course_key, unicode(course_key), course=course,
+            certificate=cert)
+        # Only a completed check is cached: the grade was raised or was
+        # already up to date
+        if regenerated is True or regenerated is False:
+            status_cache.remember(
+                student.id, course_key, cert_status, regen_checked=True)
+        return regenerated
+    status_cache.remember(student.id, course_key, cert_status)
+    return cert_status
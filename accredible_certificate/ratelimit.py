@@ -0,0 +1,124 @@
+"""
+Adaptive client side rate limiting for the Accredible API.
+
+``AdaptiveRateLimiter`` combines a token bucket (requests per second) with
+a cap on concurrent requests. Both shrink multiplicatively when Accredible
+answers 429 and grow back additively while calls succeed, so bulk runs
+settle just below the account quota instead of failing learners.
+"""
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+DEFAULT_RATE = 10.0
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def parse_retry_after(value, default=DEFAULT_RETRY_AFTER):
+    """
+    Return the delay in seconds of a Retry-After header value.
+    """
+    if not value:
+        return default
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return default
+        return max(mktime_tz(parsed) - time.time(), 0)
+
+
+class AdaptiveRateLimiter(object):
+    """
+    Thread safe limiter shared by every call made with one api key.
+
+    Arguments:
+      max_rate        - ceiling of requests per second, the starting rate
+      max_concurrency - ceiling of requests in flight
+      min_rate        - floor the rate never goes below
+    """
+
+    def __init__(self, max_rate=DEFAULT_RATE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 min_rate=DEFAULT_MIN_RATE):
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.max_concurrency = max_concurrency
+        self.rate = self.max_rate
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.paused_until = 0
+        self._tokens = 1.0
+        self._updated = time.time()
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(
+            self._tokens + (now - self._updated) * self.rate,
+            max(self.rate, 1.0)
+        )
+        self._updated = now
+
+    def acquire(self, timeout=None):
+        """
+        Block until a request may be sent, the caller must ``release()``.
+
+        With a ``timeout`` (in seconds), return False instead of waiting
+        longer than that, and right away while paused for longer than that.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                now = time.time()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.in_flight >= self.concurrency:
+                    wait = None
+                elif self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    return True
+                if deadline is not None:
+                    if wait is None:
+                        wait = deadline - now
+                    elif now + wait > deadline:
+                        return False
+                    if wait <= 0:
+                        return False
+                self._condition.wait(wait)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def succeeded(self):
+        """
+        Additive increase after a call that wasn't throttled.
+        """
+        with self._condition:
+            self.rate = min(self.rate + self.rate * 0.05 + 0.1, self.max_rate)
+            if self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+            self._condition.notify_all()
+
+    def throttled(self, retry_after=None):
+        """
+        Multiplicative decrease after a 429, pausing every caller for
+        ``retry_after`` seconds.
+        """
+        with self._condition:
+            self.rate = max(self.rate / 2, self.min_rate)
+            self.concurrency = max(self.concurrency // 2, 1)
+            self._tokens = min(self._tokens, 0)
+            self.paused_until = max(
+                self.paused_until,
+                time.time() + parse_retry_after(retry_after)
+            )
+            self._condition.notify_all()
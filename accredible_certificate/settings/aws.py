@@ -0,0 +1,37 @@
+# Settings read from lms.env.json, overriding the defaults of common.py
+ENV_SETTINGS = (
+    'ACCREDIBLE_API_URL',
+    'ACCREDIBLE_CONNECT_TIMEOUT',
+    'ACCREDIBLE_READ_TIMEOUT',
+    'ACCREDIBLE_MAX_RETRIES',
+    'ACCREDIBLE_RETRY_BACKOFF',
+    'ACCREDIBLE_POOL_SIZE',
+    'ACCREDIBLE_PAGE_SIZE',
+    'ACCREDIBLE_RATE_LIMIT',
+    'ACCREDIBLE_MAX_CONCURRENCY',
+    'ACCREDIBLE_THROTTLE_RETRIES',
+    'ACCREDIBLE_REQUEST_MAX_WAIT',
+    'ACCREDIBLE_BREAKER_FAILURES',
+    'ACCREDIBLE_BREAKER_SLOW_CALL',
+    'ACCREDIBLE_BREAKER_RESET',
+    'ACCREDIBLE_COURSE_CONTEXT_TTL',
+    'ACCREDIBLE_COURSE_CONTEXT_CACHE_SIZE',
+    'ACCREDIBLE_STATUS_CACHE_TTL',
+    'ACCREDIBLE_ASYNC_MODE',
+    'ACCREDIBLE_ASYNC_STALE_AFTER',
+    'ACCREDIBLE_METRICS_SINK',
+    'ACCREDIBLE_WEBHOOK_BATCH_SIZE',
+    'ACCREDIBLE_WEBHOOK_FLUSH_DELAY',
+)
+
+# Secrets, read from lms.auth.json
+AUTH_SETTINGS = (
+    'ACCREDIBLE_WEBHOOK_SECRET',
+)
+
+
+def plugin_settings(settings):
+    for name in ENV_SETTINGS:
+        setattr(settings, name, settings.ENV_TOKENS.get(name, getattr(settings, name)))
+    for name in AUTH_SETTINGS:
+        setattr(settings, name, settings.AUTH_TOKENS.get(name, getattr(settings, name)))
@@ -1,2 +1,44 @@
 def plugin_settings(settings):
-    pass
+    # Accredible API client
+    settings.ACCREDIBLE_API_URL = 'https://api.accredible.com/v1/'
+    settings.ACCREDIBLE_CONNECT_TIMEOUT = 3.05
+    settings.ACCREDIBLE_READ_TIMEOUT = 30
+    settings.ACCREDIBLE_MAX_RETRIES = 3
+    settings.ACCREDIBLE_RETRY_BACKOFF = 0.5
+    settings.ACCREDIBLE_POOL_SIZE = 10
+    settings.ACCREDIBLE_PAGE_SIZE = 100
+    # Requests per second and in flight, lowered on 429 and raised back
+    settings.ACCREDIBLE_RATE_LIMIT = 10
+    settings.ACCREDIBLE_MAX_CONCURRENCY = 8
+    # Retries of a throttled call by the management commands, LMS requests
+    # don't retry and wait at most ACCREDIBLE_REQUEST_MAX_WAIT seconds
+    settings.ACCREDIBLE_THROTTLE_RETRIES = 5
+    settings.ACCREDIBLE_REQUEST_MAX_WAIT = 1.0
+    # Circuit breaker: consecutive failed or slow (seconds) calls opening it,
+    # seconds before a probe call
+    settings.ACCREDIBLE_BREAKER_FAILURES = 5
+    settings.ACCREDIBLE_BREAKER_SLOW_CALL = 10.0
+    settings.ACCREDIBLE_BREAKER_RESET = 30.0
+
+    # Per-course credential data cache
+    settings.ACCREDIBLE_COURSE_CONTEXT_TTL = 300
+    settings.ACCREDIBLE_COURSE_CONTEXT_CACHE_SIZE = 128
+
+    # Seconds request_certificate reuses a certificate status and the last
+    # regeneration check, 0 disables the cache
+    settings.ACCREDIBLE_STATUS_CACHE_TTL = 300
+
+    # Process request_certificate in the background: None, 'celery' or 'local'
+    settings.ACCREDIBLE_ASYNC_MODE = None
+    # Seconds after which a pending request, or a processing one whose
+    # worker stopped refreshing it, is considered lost (worker crash,
+    # dropped task) and a new one is queued
+    settings.ACCREDIBLE_ASYNC_STALE_AFTER = 600
+
+    # Where issuance timings and counters are sent, see metrics.py
+    settings.ACCREDIBLE_METRICS_SINK = 'accredible_certificate.metrics.DogStatsSink'
+
+    # Accredible webhooks: HMAC-SHA256 secret, coalescing batch and delay
+    settings.ACCREDIBLE_WEBHOOK_SECRET = None
+    settings.ACCREDIBLE_WEBHOOK_BATCH_SIZE = 100
+    settings.ACCREDIBLE_WEBHOOK_FLUSH_DELAY = 2.0
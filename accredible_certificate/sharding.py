@@ -0,0 +1,28 @@
+"""
+Partitioning of a course's learners between several hosts (``--shard K/N``).
+"""
+
+
+def parse_shard(value):
+    """
+    Parse ``K/N`` into ``(K, N)``, raises ValueError when it is invalid.
+    """
+    index, count = [int(part) for part in value.split('/')]
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(value)
+    return index, count
+
+
+def in_shard(queryset, shard, column='id'):
+    """
+    Restrict ``queryset`` to the rows whose user id ``column`` falls in
+    ``shard``, a ``(K, N)`` pair: the ids equal to K modulo N.
+    """
+    if shard is None:
+        return queryset
+    index, count = shard
+    column = '{}.{}'.format(queryset.model._meta.db_table, column)
+    return queryset.extra(
+        where=['{} %% %s = %s'.format(column)],
+        params=[count, index]
+    )
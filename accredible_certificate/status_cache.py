@@ -0,0 +1,57 @@
+"""
+Read-through cache of the certificate status of a (user, course).
+
+request_certificate is hit on every dashboard and course page view. An entry
+records the GeneratedCertificate status and, for downloadable certificates,
+when regen_cert last checked the grade against Accredible, so repeat calls
+within ``ACCREDIBLE_STATUS_CACHE_TTL`` seconds skip the database and the API.
+
+Every code path writing a GeneratedCertificate calls ``invalidate`` (or
+``invalidate_many``); a TTL of 0 disables the cache.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_TTL = 300
+KEY_PREFIX = 'accredible:status'
+
+
+def ttl():
+    return getattr(settings, 'ACCREDIBLE_STATUS_CACHE_TTL', DEFAULT_TTL)
+
+
+def cache_key(user_id, course_id):
+    return u'{}:{}:{}'.format(KEY_PREFIX, user_id, course_id)
+
+
+def get(user_id, course_id):
+    """
+    Return the cached entry, a dict with ``status`` and ``regen_checked``
+    (a timestamp or None), or None.
+    """
+    if not ttl():
+        return None
+    return cache.get(cache_key(user_id, course_id))
+
+
+def remember(user_id, course_id, status, regen_checked=False):
+    if not ttl():
+        return
+    cache.set(cache_key(user_id, course_id), {
+        'status': status,
+        'regen_checked': time.time() if regen_checked else None,
+    }, ttl())
+
+
+def invalidate(user_id, course_id):
+    if ttl():
+        cache.delete(cache_key(user_id, course_id))
+
+
+def invalidate_many(user_ids, course_id):
+    if ttl():
+        cache.delete_many([
+            cache_key(user_id, course_id) for user_id in user_ids
+        ])
@@ -0,0 +1,14 @@
+"""
+Celery tasks of the Accredible integration.
+"""
+from celery import task
+
+from accredible_certificate.background import run_certificate_request
+
+
+@task()
+def process_certificate_request(request_id):
+    """
+    Process a CertificateRequest recorded by request_certificate.
+    """
+    run_certificate_request(request_id)
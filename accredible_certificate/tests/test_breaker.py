@@ -0,0 +1,68 @@
+"""
+Tests of the Accredible circuit breaker.
+"""
+import unittest
+
+import mock
+
+from accredible_certificate.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@mock.patch('accredible_certificate.breaker.metrics', mock.Mock())
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('accredible_certificate.breaker.time')
+        patcher.start().time.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(
+            failure_threshold=3, slow_call=5, reset_timeout=30)
+
+    def fail(self, times):
+        for __ in range(times):
+            self.breaker.before_call()
+            self.breaker.record(False)
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.fail(1)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertTrue(self.breaker.is_open())
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_success_resets_failures(self):
+        self.fail(2)
+        self.breaker.before_call()
+        self.breaker.record(True, 0.1)
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_slow_call_is_a_failure(self):
+        for __ in range(3):
+            self.breaker.before_call()
+            self.breaker.record(True, 6)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_successful_probe_closes(self):
+        self.fail(3)
+        self.now += 31
+        self.assertFalse(self.breaker.is_open())
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        # Only one probe at a time
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        self.fail(3)
+        self.now += 31
+        self.breaker.before_call()
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertTrue(self.breaker.is_open())
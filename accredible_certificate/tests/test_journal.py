@@ -0,0 +1,53 @@
+"""
+Tests of the generate_accredible_certs progress journal.
+"""
+from django.test import TestCase
+from django.utils import timezone
+from opaque_keys.edx.locator import CourseLocator
+
+from accredible_certificate.journal import CLAIM_LEASE, GenerationJournal
+from accredible_certificate.models import GenerationJournalEntry
+
+
+class GenerationJournalTest(TestCase):
+
+    def setUp(self):
+        super(GenerationJournalTest, self).setUp()
+        self.course_key = CourseLocator('edX', 'DemoX', 'Demo_Course')
+
+    def outcomes(self):
+        return dict(GenerationJournalEntry.objects.values_list(
+            'user_id', 'outcome'))
+
+    def test_claim_once(self):
+        journal = GenerationJournal(self.course_key)
+        self.assertTrue(journal.claim(1))
+        self.assertFalse(GenerationJournal(self.course_key).claim(1))
+        self.assertFalse(
+            GenerationJournal(self.course_key, shard=(1, 2)).claim(1))
+
+    def test_takeover(self):
+        journal = GenerationJournal(self.course_key)
+        journal.record(1, error='boom')
+        journal.flush()
+        self.assertFalse(journal.claim(1))
+        self.assertTrue(journal.claim(1, takeover=(GenerationJournalEntry.FAILED,)))
+        self.assertEqual(self.outcomes(), {1: GenerationJournalEntry.CLAIMED})
+
+    def test_reset_keeps_live_claims(self):
+        running = GenerationJournal(self.course_key, shard=(0, 2))
+        running.claim(2)
+        running.claim(4)
+        running.record(4, 'downloadable')
+        running.flush()
+        running.claim(6)
+        GenerationJournalEntry.objects.filter(user_id=6).update(
+            modified=timezone.now() - CLAIM_LEASE * 2)
+
+        # A new run of the same shard, or of the whole course, only drops
+        # the outcomes and the claims left by a stopped run
+        GenerationJournal(self.course_key, shard=(0, 2)).reset()
+        self.assertEqual(self.outcomes(), {2: GenerationJournalEntry.CLAIMED})
+        GenerationJournal(self.course_key).reset()
+        self.assertEqual(self.outcomes(), {2: GenerationJournalEntry.CLAIMED})
+        self.assertFalse(GenerationJournal(self.course_key).claim(2))
@@ -0,0 +1,175 @@
+"""
+Tests of the request_certificate flow.
+
+Grading, the course and Accredible are mocked, so the query counts only
+cover this module's own database work.
+"""
+import json
+
+import mock
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from lms.djangoapps.certificates.models import CertificateStatuses, GeneratedCertificate
+from lms.djangoapps.certificates.tests.factories import GeneratedCertificateFactory
+from opaque_keys.edx.locator import CourseLocator
+from openedx.core.djangoapps.signals.signals import COURSE_CERT_AWARDED, COURSE_CERT_CHANGED
+from student.tests.factories import UserFactory
+
+from accredible_certificate import metrics
+from accredible_certificate.client import ThrottledError
+from accredible_certificate.models import AccredibleCredential
+from accredible_certificate.queue import DEFERRED, request_certificate_for
+from accredible_certificate.views import request_certificate
+
+API_KEY = 'test-key'
+
+
+@override_settings(ACCREDIBLE_STATUS_CACHE_TTL=300)
+class RequestCertificateForTest(TestCase):
+
+    def setUp(self):
+        super(RequestCertificateForTest, self).setUp()
+        cache.clear()
+        self.course_key = CourseLocator('edX', 'DemoX', 'Demo_Course')
+        self.achievement_id = self.course_key.to_deprecated_string()
+        self.student = UserFactory(email='learner@example.com')
+
+        self.client = mock.Mock()
+        self.client.breaker.is_open.return_value = False
+        self.client.create_credential.return_value = mock.Mock(
+            status_code=200,
+            json=mock.Mock(return_value={"credential": {
+                "id": 42,
+                "recipient": {"email": self.student.email},
+                "grade": 80,
+            }})
+        )
+        self.client.update_credential.return_value = mock.Mock(status_code=200)
+        course_context = mock.Mock(course_id_string=self.achievement_id)
+        course_context.credential_payload.return_value = {
+            "credential": {"recipient": {"email": self.student.email}}}
+        self.grade_factory = mock.Mock()
+        self.grade_factory.return_value.read.return_value = mock.Mock(percent=0.8)
+
+        for target, value in (
+                ('accredible_certificate.queue.get_client', mock.Mock(return_value=self.client)),
+                ('accredible_certificate.queue.courses', mock.Mock()),
+                ('accredible_certificate.queue.get_course_context',
+                 mock.Mock(return_value=course_context)),
+                ('accredible_certificate.queue.CourseGradeFactory', self.grade_factory),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for patcher in (
+                mock.patch.object(metrics, '_sink', metrics.NullSink()),
+                mock.patch.object(COURSE_CERT_CHANGED, 'send_robust'),
+                mock.patch.object(COURSE_CERT_AWARDED, 'send_robust'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def certificate(self, **kwargs):
+        return GeneratedCertificateFactory(
+            user=self.student, course_id=self.course_key, **kwargs)
+
+    def request(self):
+        return request_certificate_for(self.student, self.course_key, API_KEY)
+
+    def test_issue(self):
+        self.certificate(status=CertificateStatuses.notpassing, grade='0.2')
+        # certificate, student context, certificate update, mirror insert
+        with self.assertNumQueries(4):
+            self.request()
+        cert = GeneratedCertificate.objects.get(user=self.student)
+        self.assertEqual(cert.status, CertificateStatuses.downloadable)
+        self.assertEqual(cert.key, '42')
+        self.assertTrue(AccredibleCredential.objects.filter(
+            credential_id=42, achievement_id=self.achievement_id).exists())
+
+    def test_issue_deferred(self):
+        self.certificate(status=CertificateStatuses.notpassing, grade='0.2')
+        self.client.breaker.is_open.return_value = True
+        self.assertEqual(self.request(), DEFERRED)
+        self.assertFalse(self.client.create_credential.called)
+
+    def test_regen(self):
+        self.certificate(status=CertificateStatuses.downloadable, grade='0.5')
+        AccredibleCredential.objects.create(
+            credential_id=42, achievement_id=self.achievement_id,
+            email=self.student.email, grade=50)
+        # certificate, mirror lookup, mirror and certificate grade updates
+        with self.assertNumQueries(4):
+            self.assertTrue(self.request())
+        self.assertEqual(
+            self.client.update_credential.call_args[0][1]["credential"]["grade"], 80)
+        self.assertEqual(
+            AccredibleCredential.objects.get(credential_id=42).grade, 80)
+
+        # The check is cached
+        with self.assertNumQueries(0):
+            self.assertFalse(self.request())
+        self.assertEqual(self.client.update_credential.call_count, 1)
+
+    def test_regen_unchanged_grade(self):
+        self.certificate(status=CertificateStatuses.downloadable, grade='0.8')
+        with self.assertNumQueries(1):
+            self.assertFalse(self.request())
+        self.assertFalse(self.client.update_credential.called)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.request())
+
+    def test_issue_throttled(self):
+        self.certificate(status=CertificateStatuses.notpassing, grade='0.2')
+        self.client.create_credential.return_value = mock.Mock(status_code=429)
+        self.assertEqual(self.request(), DEFERRED)
+        self.client.create_credential.side_effect = ThrottledError()
+        self.assertEqual(self.request(), DEFERRED)
+        self.assertEqual(
+            GeneratedCertificate.objects.get(user=self.student).status,
+            CertificateStatuses.notpassing)
+
+    def test_regen_grade_float_noise(self):
+        # 0.07 * 100 is 7.000000000000001
+        self.grade_factory.return_value.read.return_value = mock.Mock(percent=0.07)
+        self.certificate(status=CertificateStatuses.downloadable, grade='0.05')
+        AccredibleCredential.objects.create(
+            credential_id=42, achievement_id=self.achievement_id,
+            email=self.student.email, grade=7)
+        self.assertFalse(self.request())
+        self.assertFalse(self.client.update_credential.called)
+
+    def test_failed_update_not_cached(self):
+        self.certificate(status=CertificateStatuses.downloadable, grade='0.5')
+        AccredibleCredential.objects.create(
+            credential_id=42, achievement_id=self.achievement_id,
+            email=self.student.email, grade=50)
+        self.client.update_credential.return_value = mock.Mock(status_code=500)
+        self.assertEqual(self.request(), "errors")
+        self.client.update_credential.return_value = mock.Mock(status_code=200)
+        self.assertTrue(self.request())
+
+    def test_cached_status(self):
+        self.certificate(status=CertificateStatuses.generating)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.request(), CertificateStatuses.generating)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.request(), CertificateStatuses.generating)
+        # A cached status needs no Accredible call, even while it is down
+        self.client.breaker.is_open.return_value = True
+        self.assertEqual(self.request(), CertificateStatuses.generating)
+
+    @override_settings(ACCREDIBLE_ASYNC_MODE='celery')
+    def test_async_cached_status(self):
+        self.certificate(status=CertificateStatuses.generating)
+        self.request()
+        request = RequestFactory().post(
+            '/accredible/request_certificate',
+            {'course_id': unicode(self.course_key)})
+        request.user = self.student
+        with mock.patch('accredible_certificate.views.submit_certificate_request') as submit:
+            response = request_certificate(request)
+        self.assertFalse(submit.called)
+        self.assertEqual(
+            json.loads(response.content),
+            {'add_status': CertificateStatuses.generating})
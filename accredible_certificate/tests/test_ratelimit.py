@@ -0,0 +1,88 @@
+"""
+Tests of the adaptive rate limiter.
+"""
+import threading
+import time
+import unittest
+from email.utils import formatdate
+
+from accredible_certificate.ratelimit import AdaptiveRateLimiter, parse_retry_after
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after('2'), 2.0)
+        self.assertEqual(parse_retry_after('-3'), 0)
+
+    def test_http_date(self):
+        value = formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(value), 60, delta=2)
+
+    def test_missing_or_invalid(self):
+        self.assertEqual(parse_retry_after(None), 1.0)
+        self.assertEqual(parse_retry_after('soon', default=5), 5)
+
+
+class AdaptiveRateLimiterTest(unittest.TestCase):
+
+    def test_throttled_halves_down_to_floor(self):
+        limiter = AdaptiveRateLimiter(max_rate=8, max_concurrency=4, min_rate=1)
+        limiter.throttled('0')
+        self.assertEqual(limiter.rate, 4)
+        self.assertEqual(limiter.concurrency, 2)
+        for __ in range(5):
+            limiter.throttled('0')
+        self.assertEqual(limiter.rate, 1)
+        self.assertEqual(limiter.concurrency, 1)
+
+    def test_succeeded_grows_back_to_ceiling(self):
+        limiter = AdaptiveRateLimiter(max_rate=8, max_concurrency=4, min_rate=1)
+        for __ in range(5):
+            limiter.throttled('0')
+        for __ in range(100):
+            limiter.succeeded()
+        self.assertEqual(limiter.rate, 8)
+        self.assertEqual(limiter.concurrency, 4)
+
+    def test_concurrency_cap(self):
+        limiter = AdaptiveRateLimiter(max_rate=1000, max_concurrency=1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def second():
+            limiter.acquire()
+            acquired.set()
+            limiter.release()
+
+        thread = threading.Thread(target=second)
+        thread.daemon = True
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release()
+        self.assertTrue(acquired.wait(1))
+        thread.join(1)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_throttled_pauses_callers(self):
+        limiter = AdaptiveRateLimiter(max_rate=1000, max_concurrency=4)
+        limiter.throttled('0.2')
+        start = time.time()
+        limiter.acquire()
+        limiter.release()
+        self.assertGreaterEqual(time.time() - start, 0.15)
+
+    def test_acquire_timeout_while_paused(self):
+        limiter = AdaptiveRateLimiter(max_rate=1000, max_concurrency=4)
+        limiter.throttled('60')
+        start = time.time()
+        self.assertFalse(limiter.acquire(timeout=1))
+        self.assertLess(time.time() - start, 0.1)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_acquire_timeout_at_concurrency_cap(self):
+        limiter = AdaptiveRateLimiter(max_rate=1000, max_concurrency=1)
+        self.assertTrue(limiter.acquire(timeout=0.1))
+        self.assertFalse(limiter.acquire(timeout=0.1))
+        limiter.release()
+        self.assertTrue(limiter.acquire(timeout=0.1))
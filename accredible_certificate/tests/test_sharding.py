@@ -0,0 +1,33 @@
+"""
+Tests of the --shard helpers.
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase
+from student.tests.factories import UserFactory
+
+from accredible_certificate.sharding import in_shard, parse_shard
+
+
+class ParseShardTest(TestCase):
+
+    def test_valid(self):
+        self.assertEqual(parse_shard('0/1'), (0, 1))
+        self.assertEqual(parse_shard('2/3'), (2, 3))
+
+    def test_invalid(self):
+        for value in ('3/3', '-1/2', '0/0', 'a/b', '1', '1/2/3'):
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+
+class InShardTest(TestCase):
+
+    def test_in_shard(self):
+        ids = [UserFactory().id for __ in range(6)]
+        users = User.objects.filter(id__in=ids)
+        self.assertIs(in_shard(users, None), users)
+        for index in range(3):
+            self.assertEqual(
+                sorted(in_shard(users, (index, 3)).values_list('id', flat=True)),
+                [user_id for user_id in ids if user_id % 3 == index]
+            )
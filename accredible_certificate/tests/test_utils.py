@@ -0,0 +1,40 @@
+"""
+Tests of the bulk command helpers.
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase
+from student.tests.factories import UserFactory
+
+from accredible_certificate.utils import chunked, keyset_chunks
+
+
+class ChunkedTest(TestCase):
+
+    def test_chunked(self):
+        self.assertEqual(
+            list(chunked(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+
+class KeysetChunksTest(TestCase):
+
+    def setUp(self):
+        self.ids = sorted(UserFactory().id for __ in range(5))
+        self.users = User.objects.filter(id__in=self.ids)
+
+    def ids_of(self, chunks):
+        return [[user.id for user in chunk] for chunk in chunks]
+
+    def test_chunks_in_pk_order(self):
+        # One query per chunk, and one finding the end
+        with self.assertNumQueries(4):
+            chunks = self.ids_of(keyset_chunks(self.users.order_by('-id'), 2))
+        self.assertEqual(
+            chunks, [self.ids[0:2], self.ids[2:4], self.ids[4:]])
+
+    def test_after(self):
+        self.assertEqual(
+            self.ids_of(keyset_chunks(self.users, 2, after=self.ids[1])),
+            [self.ids[2:4], self.ids[4:]])
+        self.assertEqual(
+            list(keyset_chunks(self.users, 2, after=self.ids[4])), [])
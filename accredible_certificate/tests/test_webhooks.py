@@ -0,0 +1,121 @@
+"""
+Tests of the Accredible webhooks.
+"""
+import hashlib
+import hmac
+import json
+
+import mock
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from lms.djangoapps.certificates.models import CertificateStatuses, GeneratedCertificate
+from lms.djangoapps.certificates.tests.factories import GeneratedCertificateFactory
+from opaque_keys.edx.locator import CourseLocator
+from student.tests.factories import UserFactory
+
+from accredible_certificate import webhooks
+from accredible_certificate.models import AccredibleCredential, WebhookEvent
+from accredible_certificate.views import accredible_webhook
+from accredible_certificate.webhooks import (
+    apply_events,
+    event_credentials,
+    store_events,
+    valid_signature
+)
+
+BODY = '{"data": {"credential": {"id": 1}}}'
+
+
+def sign(body, secret='secret'):
+    return hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+@override_settings(ACCREDIBLE_WEBHOOK_SECRET='secret')
+class ValidSignatureTest(SimpleTestCase):
+
+    def test_valid(self):
+        self.assertTrue(valid_signature(BODY, sign(BODY)))
+
+    def test_invalid(self):
+        self.assertFalse(valid_signature(BODY, sign(BODY, 'other')))
+        self.assertFalse(valid_signature(BODY + ' ', sign(BODY)))
+        self.assertFalse(valid_signature(BODY, None))
+
+    @override_settings(ACCREDIBLE_WEBHOOK_SECRET=None)
+    def test_no_secret(self):
+        self.assertFalse(valid_signature(BODY, sign(BODY)))
+
+
+class EventCredentialsTest(SimpleTestCase):
+
+    def test_single_and_batched_events(self):
+        credential = {"id": 1, "recipient": {"email": "learner@example.com"}}
+        self.assertEqual(
+            event_credentials({"data": {"credential": credential}}),
+            [credential])
+        self.assertEqual(
+            event_credentials({"events": [
+                {"data": {"credential": credential}},
+                {"data": {"credential": {"id": 2}}},
+                {"data": None},
+            ]}),
+            [credential])
+
+
+@override_settings(ACCREDIBLE_WEBHOOK_SECRET='secret')
+class WebhookTest(TestCase):
+
+    def setUp(self):
+        super(WebhookTest, self).setUp()
+        cache.clear()
+        self.student = UserFactory(email='learner@example.com')
+        self.course_key = CourseLocator('edX', 'DemoX', 'Demo_Course')
+        self.cert = GeneratedCertificateFactory(
+            user=self.student, course_id=self.course_key,
+            status=CertificateStatuses.generating, key='42')
+        AccredibleCredential.objects.create(
+            credential_id=42, achievement_id='edX/DemoX/Demo_Course',
+            email=self.student.email, grade=80)
+
+    def post(self, credential):
+        body = json.dumps({"data": {"credential": credential}})
+        return accredible_webhook(RequestFactory().post(
+            '/accredible/webhook', body, content_type='application/json',
+            HTTP_X_ACCREDIBLE_SIGNATURE=sign(body)))
+
+    def credential(self, **values):
+        return dict({
+            "id": 42,
+            "recipient": {"email": self.student.email},
+            "grade": 80,
+            "approve": True,
+        }, **values)
+
+    def test_stored_before_answering(self):
+        with mock.patch.object(webhooks.webhook_buffer, 'flush_delay', 60), \
+                mock.patch.object(webhooks.webhook_buffer, 'flush'):
+            self.assertEqual(self.post(self.credential()).status_code, 200)
+        # Not applied yet, the event survives the worker
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertEqual(
+            GeneratedCertificate.objects.get(id=self.cert.id).status,
+            CertificateStatuses.generating)
+
+        self.assertEqual(apply_events(), 1)
+        self.assertFalse(WebhookEvent.objects.exists())
+        self.assertEqual(
+            GeneratedCertificate.objects.get(id=self.cert.id).status,
+            CertificateStatuses.downloadable)
+
+    def test_coalesced(self):
+        store_events([self.credential(approve=False), self.credential(grade=90)])
+        self.assertEqual(apply_events(batch_size=10), 2)
+        self.assertEqual(AccredibleCredential.objects.get().grade, 90)
+
+    def test_keeps_achievement_id(self):
+        with mock.patch.object(webhooks.webhook_buffer, 'flush_delay', 0):
+            self.assertEqual(self.post(self.credential()).status_code, 200)
+        self.assertFalse(WebhookEvent.objects.exists())
+        credential = AccredibleCredential.objects.get()
+        self.assertTrue(credential.approved)
+        self.assertEqual(credential.achievement_id, 'edX/DemoX/Demo_Course')
@@ -1,9 +1,13 @@
 from django.conf.urls import url
 from views import request_certificate
+from views import certificate_request_status
 from views import update_certificate
+from views import accredible_webhook
 
 
 urlpatterns = [
     url(r'^request_certificate$', request_certificate, name='request_certificate'),
-    url(r'^update_certificate$', update_certificate, name='update_certificate')
+    url(r'^certificate_request_status$', certificate_request_status, name='certificate_request_status'),
+    url(r'^update_certificate$', update_certificate, name='update_certificate'),
+    url(r'^webhook$', accredible_webhook, name='accredible_webhook')
 ]
@@ -0,0 +1,34 @@
+"""
+Small helpers shared by the bulk certificate commands.
+"""
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """
+    Yield lists of at most ``size`` consecutive elements of ``iterable``.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def keyset_chunks(queryset, size, after=None):
+    """
+    Yield lists of at most ``size`` rows of ``queryset`` in primary key
+    order, starting after the primary key ``after``.
+
+    Every chunk is its own ``pk > last`` query, so only one chunk is held
+    in memory and late chunks cost the same as the first ones.
+    """
+    queryset = queryset.order_by('pk')
+    while True:
+        page = queryset if after is None else queryset.filter(pk__gt=after)
+        chunk = list(page[:size])
+        if not chunk:
+            return
+        yield chunk
+        after = chunk[-1].pk
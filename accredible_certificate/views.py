@@ -3,26 +3,31 @@ from dogapi import dog_stats_api
 import json
 import logging
 
-from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from capa.xqueue_interface import XQUEUE_METRIC_NAME
 from lms.djangoapps.certificates.models import (
-    certificate_status_for_student,
     CertificateStatuses,
     GeneratedCertificate
 )
-from accredible_certificate.queue import CertificateGeneration
+from accredible_certificate.queue import cached_certificate_status, request_certificate_for
+from accredible_certificate.background import async_mode, submit_certificate_request
+from accredible_certificate.models import CertificateRequest
+from accredible_certificate import metrics
+from accredible_certificate import status_cache
+from accredible_certificate.webhooks import (
+    SIGNATURE_HEADER,
+    event_credentials,
+    valid_signature,
+    webhook_buffer
+)
 from opaque_keys.edx.locations import SlashSeparatedCourseKey
 from django.db import transaction
 from django.conf import settings
 from opaque_keys.edx.keys import CourseKey
 
-from courseware.courses import (
-    get_course,
-)
-
 logger = logging.getLogger(__name__)
 
 
@@ -34,33 +39,38 @@ def request_certificate(request):
     We intentionally use the same machinery as is used for doing certification
     at the end of a course run, so that we can be sure users get graded and
     then if and only if they pass, do they get a certificate issued.
+
+    With ACCREDIBLE_ASYNC_MODE set the request is processed by a background
+    worker and the response reports it as pending, poll
+    certificate_request_status for the outcome. An outcome found in the
+    status cache is answered right away in both modes.
     """
     if request.method == "POST":
         if request.user.is_authenticated():
-            # Enter your api key here
-            xqci = CertificateGeneration(
-                api_key=settings.APPSEMBLER_FEATURES['ACCREDIBLE_API_KEY']
-            )
-            username = request.user.username
-            student = User.objects.get(username=username)
+            student = request.user
             course_key = CourseKey.from_string(
                 request.POST.get('course_id')
             )
-            course = get_course(course_key)
-
-            status = certificate_status_for_student(
+            if async_mode():
+                # A cached outcome is answered right away, as the
+                # synchronous call would, without queueing a request
+                cached = cached_certificate_status(student, course_key)
+                if cached is not None:
+                    return HttpResponse(
+                        json.dumps({'add_status': cached}),
+                        content_type='application/json')
+                cert_request = submit_certificate_request(student, course_key)
+                return HttpResponse(
+                    json.dumps(
+                        {'add_status': cert_request.status,
+                         'request_id': cert_request.id}
+                    ), content_type='application/json')
+
+            status = request_certificate_for(
                 student,
-                course_key)['status']
-            if status in [CertificateStatuses.unavailable, CertificateStatuses.notpassing, CertificateStatuses.error]:
-                logger.info(
-                    'Grading and certification requested for user {} in course {} via /request_certificate call'.format(username, course_key))
-                status = xqci.add_cert(student, course_key, course=course)
-            # Check if the user already have certificate for this course
-            if status == "downloadable":
-                # If the user has better grade than the one he has already got, generate new certificate
-                if GeneratedCertificate.objects.filter(user=student, course_id=course_key):
-                    certificate = GeneratedCertificate.objects.get(user=student, course_id=course_key)
-                    status = xqci.regen_cert(student, course_key, request.POST.get('course_id'), course=course)
+                course_key,
+                settings.APPSEMBLER_FEATURES['ACCREDIBLE_API_KEY']
+            )
             return HttpResponse(
                 json.dumps(
                     {'add_status': status}
@@ -71,6 +81,58 @@ def request_certificate(request):
             ), content_type='application/json')
 
 
+def certificate_request_status(request):
+    """Report the state of the latest background certificate request of the
+    user for course_id, as recorded by request_certificate in async mode.
+    """
+    if not request.user.is_authenticated():
+        return HttpResponse(
+            json.dumps(
+                {'add_status': 'ERRORANONYMOUSUSER'}
+            ), content_type='application/json')
+    course_key = CourseKey.from_string(request.GET.get('course_id'))
+    cert_request = CertificateRequest.objects.filter(
+        user=request.user,
+        course_id=unicode(course_key)
+    ).order_by('-id').first()
+    if cert_request is None:
+        response = {'status': None}
+    elif cert_request.status == CertificateRequest.DONE:
+        response = {
+            'status': cert_request.status,
+            'add_status': json.loads(cert_request.result)
+        }
+    else:
+        response = {'status': cert_request.status}
+    return HttpResponse(json.dumps(response), content_type='application/json')
+
+
+@csrf_exempt
+@require_POST
+def accredible_webhook(request):
+    """
+    Receive credential events pushed by Accredible, e.g. approvals made in
+    the management console, and apply them to GeneratedCertificate without
+    waiting for change_accredible_certs_status.
+
+    The body must be signed with ACCREDIBLE_WEBHOOK_SECRET, see webhooks.py.
+    The events are stored before answering and applied in batches.
+    """
+    if not valid_signature(request.body, request.META.get(SIGNATURE_HEADER)):
+        logger.warning('Rejected Accredible webhook with an invalid signature')
+        return HttpResponseForbidden()
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    credentials = event_credentials(payload)
+    webhook_buffer.add(credentials)
+    metrics.increment('webhook.credentials', value=len(credentials))
+    return HttpResponse(json.dumps({'return_code': 0, 'received': len(credentials)}),
+                        content_type='application/json')
+
+
 @csrf_exempt
 # this method not needed as no xqueue server here
 def update_certificate(request):
@@ -144,5 +206,6 @@ def update_certificate(request):
         ])
 
         cert.save()
+        status_cache.invalidate(cert.user_id, cert.course_id)
         return HttpResponse(json.dumps({'return_code': 0}),
                             content_type='application/json')
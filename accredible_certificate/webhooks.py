@@ -0,0 +1,187 @@
+"""
+Incremental status updates pushed by Accredible webhooks.
+
+Events are authenticated with an HMAC-SHA256 signature of the body and
+their credentials stored as ``WebhookEvent`` rows before the webhook is
+answered. Stored events are applied in batches, coalesced per credential
+(the latest event wins): when ``ACCREDIBLE_WEBHOOK_BATCH_SIZE`` credentials
+are pending or ``ACCREDIBLE_WEBHOOK_FLUSH_DELAY`` seconds after the first
+one arrived. Events left by a worker that stopped before applying them are
+applied by the next batch, on any worker.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from lms.djangoapps.certificates.models import CertificateStatuses, GeneratedCertificate
+
+from accredible_certificate.mirror import store_credentials
+from accredible_certificate.models import WebhookEvent
+from accredible_certificate import status_cache
+from accredible_certificate.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'HTTP_X_ACCREDIBLE_SIGNATURE'
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_DELAY = 2.0
+UPDATE_CHUNK_SIZE = 500
+
+
+def valid_signature(body, signature):
+    """
+    Check the hex HMAC-SHA256 ``signature`` of ``body``.
+    """
+    secret = getattr(settings, 'ACCREDIBLE_WEBHOOK_SECRET', None)
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.encode('utf-8'))
+
+
+def event_credentials(payload):
+    """
+    Return the credentials carried by a webhook payload, a single event or
+    ``{"events": [...]}``.
+    """
+    events = payload.get("events") if "events" in payload else [payload]
+    credentials = []
+    for event in events:
+        credential = (event.get("data") or {}).get("credential")
+        if credential and credential.get("id") and credential.get("recipient"):
+            credentials.append(credential)
+    return credentials
+
+
+def apply_credentials(credentials):
+    """
+    Write a batch of credentials to the mirror and the certificates.
+
+    Approved credentials move their generating certificate to downloadable;
+    certificates whose credential url changed get the new download_url.
+    """
+    store_credentials(credentials)
+    approved = [
+        str(credential["id"]) for credential in credentials
+        if credential.get("approve")
+    ]
+    urls = dict(
+        (str(credential["id"]), credential["url"])
+        for credential in credentials if credential.get("url")
+    )
+    with transaction.atomic():
+        for chunk in chunked(approved, UPDATE_CHUNK_SIZE):
+            rows = list(GeneratedCertificate.objects.filter(
+                key__in=chunk,
+                status=CertificateStatuses.generating
+            ).values_list('id', 'user_id', 'course_id'))
+            GeneratedCertificate.objects.filter(
+                id__in=[cert_id for cert_id, __, __ in rows],
+                status=CertificateStatuses.generating
+            ).update(
+                status=CertificateStatuses.downloadable,
+                modified_date=timezone.now()
+            )
+            for __, user_id, course_id in rows:
+                status_cache.invalidate(user_id, course_id)
+        for chunk in chunked(urls.keys(), UPDATE_CHUNK_SIZE):
+            for cert_id, user_id, course_id, key, download_url in GeneratedCertificate.objects.filter(
+                    key__in=chunk).values_list(
+                        'id', 'user_id', 'course_id', 'key', 'download_url'):
+                if download_url.split('?')[0] != urls[key]:
+                    GeneratedCertificate.objects.filter(id=cert_id).update(
+                        download_url=urls[key],
+                        modified_date=timezone.now()
+                    )
+                    status_cache.invalidate(user_id, course_id)
+
+
+def store_events(credentials):
+    """
+    Durably queue ``credentials`` to be applied, in one query.
+    """
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(
+            credential_id=credential["id"],
+            credential=json.dumps(credential)
+        )
+        for credential in credentials
+    ])
+
+
+def apply_events(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Apply the stored events, oldest first, ``batch_size`` at a time.
+
+    Events are deleted once applied, a batch that fails stays stored for
+    the next call. Applying an event twice, e.g. on two workers at once,
+    writes the same values again. Returns the number of events applied.
+    """
+    applied = 0
+    while True:
+        events = list(WebhookEvent.objects.order_by('id').values_list(
+            'id', 'credential_id', 'credential')[:batch_size])
+        if not events:
+            return applied
+        credentials = {}
+        for __, credential_id, credential in events:
+            credentials[credential_id] = json.loads(credential)
+        apply_credentials(credentials.values())
+        WebhookEvent.objects.filter(
+            id__in=[event_id for event_id, __, __ in events]).delete()
+        applied += len(events)
+
+
+class WebhookBuffer(object):
+    """
+    Stores the credentials of incoming events and applies them in batches.
+    """
+
+    def __init__(self, batch_size=None, flush_delay=None):
+        self.batch_size = batch_size or getattr(
+            settings, 'ACCREDIBLE_WEBHOOK_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        if flush_delay is None:
+            flush_delay = getattr(
+                settings, 'ACCREDIBLE_WEBHOOK_FLUSH_DELAY', DEFAULT_FLUSH_DELAY)
+        self.flush_delay = flush_delay
+        # events stored by this process since the last flush
+        self._pending = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, credentials):
+        store_events(credentials)
+        with self._lock:
+            self._pending += len(credentials)
+            full = self._pending >= self.batch_size
+            if not full and self.flush_delay and self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self._flush_later)
+                self._timer.daemon = True
+                self._timer.start()
+        if full or not self.flush_delay:
+            self.flush()
+
+    def _flush_later(self):
+        close_old_connections()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Unable to apply Accredible webhook events')
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        with self._lock:
+            self._pending = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        apply_events(self.batch_size)
+
+
+webhook_buffer = WebhookBuffer()
@@ -0,0 +1,126 @@
+"""
+Buffered GeneratedCertificate writes for bulk certificate runs.
+
+Instead of one autocommitted ``save()`` per learner, ``CertificateWriter``
+collects the restricted and notpassing certificates of a run and writes
+them in chunks, each in a short transaction: new rows with ``bulk_create``
+and changed rows with one ``UPDATE ... CASE`` statement, Django 1.11 having
+no ``bulk_update``.
+
+Certificates whose credential was created on Accredible are never
+buffered: save_cert writes them as soon as the call returns, so a crash
+can't leave a credential without its local record, which the next run
+would create again.
+
+``bulk_create`` and ``update`` skip ``GeneratedCertificate.save()``, so the
+writer sends the COURSE_CERT_CHANGED and COURSE_CERT_AWARDED signals that
+``save()`` would have sent once every chunk is committed.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+from lms.djangoapps.certificates.models import CertificateStatuses, GeneratedCertificate
+from openedx.core.djangoapps.signals.signals import COURSE_CERT_AWARDED, COURSE_CERT_CHANGED
+
+from accredible_certificate import status_cache
+from accredible_certificate.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+WRITE_CHUNK_SIZE = 100
+
+# Columns add_cert sets on a certificate
+CERTIFICATE_FIELDS = (
+    'status', 'grade', 'name', 'mode', 'key', 'download_url',
+)
+
+
+class CertificateWriter(object):
+    """
+    Thread safe buffer of certificate writes, flushed every ``flush_size``
+    certificates and by ``flush()``.
+    """
+
+    def __init__(self, flush_size=WRITE_CHUNK_SIZE):
+        self.flush_size = flush_size
+        self._certificates = {}
+        self._lock = threading.Lock()
+        # Held for a whole flush: a flush called while another thread is
+        # writing returns only once those certificates are committed
+        self._flush_lock = threading.Lock()
+
+    def add(self, cert):
+        """
+        Buffer ``cert``.
+        """
+        with self._lock:
+            self._certificates[(cert.user_id, unicode(cert.course_id))] = cert
+            full = len(self._certificates) >= self.flush_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                certificates, self._certificates = self._certificates.values(), {}
+            for chunk in chunked(certificates, self.flush_size):
+                self.write(chunk)
+
+    def write(self, certificates):
+        now = timezone.now()
+        new = [cert for cert in certificates if cert.pk is None]
+        changed = [cert for cert in certificates if cert.pk is not None]
+        try:
+            with transaction.atomic():
+                if new:
+                    GeneratedCertificate.objects.bulk_create(new)
+                if changed:
+                    GeneratedCertificate.objects.filter(
+                        pk__in=[cert.pk for cert in changed]
+                    ).update(modified_date=now, **dict(
+                        (field, Case(*[
+                            When(pk=cert.pk, then=Value(getattr(cert, field)))
+                            for cert in changed
+                        ], output_field=GeneratedCertificate._meta.get_field(field)))
+                        for field in CERTIFICATE_FIELDS
+                    ))
+        except IntegrityError:
+            # A certificate was created meanwhile, e.g. by
+            # request_certificate: fall back to one write per row
+            logger.warning(
+                'Bulk certificate write conflicted, writing row by row')
+            for cert in certificates:
+                GeneratedCertificate.objects.update_or_create(
+                    user_id=cert.user_id,
+                    course_id=cert.course_id,
+                    defaults=dict(
+                        (field, getattr(cert, field))
+                        for field in CERTIFICATE_FIELDS
+                    )
+                )
+        by_course = defaultdict(list)
+        for cert in certificates:
+            by_course[cert.course_id].append(cert.user_id)
+            self.send_signals(cert)
+        for course_id, user_ids in by_course.items():
+            status_cache.invalidate_many(user_ids, course_id)
+
+    def send_signals(self, cert):
+        """
+        Send the signals ``GeneratedCertificate.save()`` sends, for program
+        credentials and the other listeners.
+        """
+        signal_kwargs = {
+            'sender': GeneratedCertificate,
+            'user': cert.user,
+            'course_key': cert.course_id,
+            'mode': cert.mode,
+            'status': cert.status,
+        }
+        COURSE_CERT_CHANGED.send_robust(**signal_kwargs)
+        if CertificateStatuses.is_passing_status(cert.status):
+            COURSE_CERT_AWARDED.send_robust(**signal_kwargs)